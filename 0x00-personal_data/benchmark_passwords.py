@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark comparing serial and parallel bcrypt hashing and verification
+at several cost factors.
+"""
+import os
+import time
+
+from encrypt_password import (
+    hash_password, hash_passwords, is_valid, verify_many
+)
+
+
+def rate(function, count: int) -> float:
+    """
+    Time a function processing count items.
+
+    Args:
+        function: Callable doing the work.
+        count (int): Number of items it processes.
+
+    Returns:
+        float: Items per second.
+    """
+    start = time.perf_counter()
+    function()
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """
+    Prints hashes/sec and verifications/sec, serial and parallel.
+    """
+    workers = os.cpu_count()
+    print(f"workers: {workers}")
+    print(f"{'cost':>4} {'hash/s':>9} {'par hash/s':>11} "
+          f"{'verify/s':>9} {'par verify/s':>13}")
+    for rounds in (4, 8, 10, 12):
+        count = max(workers * 2, 2 ** (14 - rounds))
+        passwords = [f"password{i}" for i in range(count)]
+        hashes = []
+
+        serial_hash = rate(lambda: hashes.extend(
+            hash_password(password, rounds) for password in passwords
+        ), count)
+        parallel_hash = rate(lambda: list(
+            hash_passwords(passwords, workers, rounds=rounds)
+        ), count)
+        pairs = list(zip(hashes, passwords))
+        serial_verify = rate(lambda: [is_valid(*pair) for pair in pairs],
+                             count)
+        parallel_verify = rate(lambda: list(verify_many(pairs, workers)),
+                               count)
+        print(f"{rounds:>4} {serial_hash:>9.1f} {parallel_hash:>11.1f} "
+              f"{serial_verify:>9.1f} {parallel_verify:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the redaction hot path of filtered_logger.
+
+Synthetic messages vary one factor at a time around a baseline: number
+of PII fields, number of key=value pairs, value length (separator
+density) and share of pairs that are PII. Each scenario is timed for:
+
+- legacy: the original field-by-field filter_datum loop
+- filter_datum
+- format: RedactingFormatter.format
+- logger: a full get_logger() call writing to os.devnull
+
+Usage:
+    ./benchmark_redaction.py [-o results.json]
+    ./benchmark_redaction.py --compare before.json after.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import timeit
+from typing import Callable, Dict, List
+
+from filtered_logger import RedactingFormatter, filter_datum, get_logger
+
+
+BASELINE = {"fields": 5, "pairs": 20, "value_length": 8, "pii_share": 0.25}
+VARIATIONS = {
+    "fields": (1, 5, 10, 20, 50, 100, 1000),
+    "pairs": (5, 20, 100, 1000),
+    "value_length": (1, 8, 64),
+    "pii_share": (0.0, 0.25, 1.0),
+}
+
+
+def legacy_filter_datum(
+    fields: List[str], redaction: str, message: str, separator: str
+) -> str:
+    """
+    The original filter_datum: one re.sub per field.
+
+    Args:
+        fields (List[str]): List of PII fields to obfuscate.
+        redaction (str): The string to replace PII fields with.
+        message (str): The log message containing PII.
+        separator (str): The separator used in the log message.
+
+    Returns:
+        str: The obfuscated log message.
+    """
+    for field in fields:
+        message = re.sub(
+            f"{field}=.+?{separator}",
+            f"{field}={redaction}{separator}",
+            message
+        )
+    return message
+
+
+def make_message(
+    fields: List[str], pairs: int, value_length: int, pii_share: float
+) -> str:
+    """
+    Builds a synthetic log message.
+
+    Args:
+        fields (List[str]): The PII field names.
+        pairs (int): Total number of key=value pairs.
+        value_length (int): Length of every value.
+        pii_share (float): Share of the pairs whose key is a PII field.
+
+    Returns:
+        str: A message such as "field0=xxxx;other1=xxxx;".
+    """
+    pii_pairs = round(pairs * pii_share)
+    value = "x" * value_length
+    parts = []
+    for i in range(pairs):
+        if i < pii_pairs and fields:
+            key = fields[i % len(fields)]
+        else:
+            key = f"other{i}"
+        parts.append(f"{key}={value};")
+    return "".join(parts)
+
+
+def scenarios() -> List[Dict]:
+    """
+    Lists the baseline and every one-factor variation of it.
+
+    Returns:
+        List[Dict]: The distinct scenario parameters.
+    """
+    result = [dict(BASELINE)]
+    for factor, values in VARIATIONS.items():
+        for value in values:
+            scenario = dict(BASELINE, **{factor: value})
+            if scenario not in result:
+                result.append(scenario)
+    return result
+
+
+def time_call(function: Callable) -> float:
+    """
+    Times a function with enough calls for a stable result.
+
+    Args:
+        function (Callable): The call to time.
+
+    Returns:
+        float: Nanoseconds per call, best of three runs.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(3, number)) / number * 1e9
+
+
+def run() -> Dict:
+    """
+    Runs every scenario against every target.
+
+    Returns:
+        Dict: Machine information and one result entry per scenario and
+        target, with ns_per_record and records_per_sec.
+    """
+    logger = get_logger()
+    devnull = open(os.devnull, "w")
+    for handler in logger.handlers:
+        handler.setStream(devnull)
+
+    results = []
+    for scenario in scenarios():
+        fields = [f"field{i}" for i in range(scenario["fields"])]
+        message = make_message(fields, scenario["pairs"],
+                               scenario["value_length"],
+                               scenario["pii_share"])
+        formatter = RedactingFormatter(fields)
+        record = logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                                   message, None, None)
+        logger.handlers[-1].setFormatter(formatter)
+
+        targets = {
+            "legacy": lambda: legacy_filter_datum(fields, "***", message,
+                                                  ";"),
+            "filter_datum": lambda: filter_datum(fields, "***", message,
+                                                 ";"),
+            "format": lambda: formatter.format(record),
+            "logger": lambda: logger.info(message),
+        }
+        for target, function in targets.items():
+            ns = time_call(function)
+            results.append(dict(scenario, target=target,
+                                ns_per_record=round(ns, 1),
+                                records_per_sec=round(1e9 / ns, 1)))
+            print(f"{target:>12} {json.dumps(scenario)} "
+                  f"{ns:>12.0f} ns {1e9 / ns:>12.0f} rec/s")
+
+    devnull.close()
+    return {"python": platform.python_version(),
+            "machine": platform.machine(), "results": results}
+
+
+def key(entry: Dict) -> str:
+    """
+    Identifies a result entry independently of its timings.
+
+    Args:
+        entry (Dict): A result entry.
+
+    Returns:
+        str: The target and scenario parameters.
+    """
+    return json.dumps({name: entry[name]
+                       for name in ["target", *BASELINE]})
+
+
+def compare(before_path: str, after_path: str) -> None:
+    """
+    Prints the change in ns/record between two saved runs.
+
+    Args:
+        before_path (str): JSON file of the reference run.
+        after_path (str): JSON file of the new run.
+    """
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before = {key(entry): entry
+                  for entry in json.load(before_file)["results"]}
+        after = json.load(after_file)["results"]
+    for entry in after:
+        old = before.get(key(entry))
+        if old is None:
+            continue
+        change = (entry["ns_per_record"] / old["ns_per_record"] - 1) * 100
+        print(f"{key(entry)} {old['ns_per_record']:>12.0f} -> "
+              f"{entry['ns_per_record']:>12.0f} ns ({change:+.1f}%)")
+
+
+def main() -> None:
+    """
+    Runs the suite, or compares two saved runs.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-o", "--output", help="save the results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two saved runs")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run()
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Module providing a pool of database connections created by get_db.
+"""
+import contextlib
+import functools
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Callable, Dict, Iterator
+
+from filtered_logger import get_db
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections.
+
+    Connections are created on demand up to max_size, checked with a
+    "SELECT 1" before being handed out, and rolled back when they are
+    given back. A background thread closes the ones idle for longer than
+    idle_timeout, keeping at least min_size open.
+    """
+
+    def __init__(
+        self, connect: Callable = None, backend: str = None,
+        min_size: int = 1, max_size: int = 10,
+        idle_timeout: float = 300.0, health_check: bool = True
+    ):
+        """
+        Initialize the ConnectionPool.
+
+        Args:
+            connect (Callable): Function returning a new connection.
+                Defaults to get_db with the given backend.
+            backend (str): Backend passed to get_db, "mysql" or "sqlite3".
+            min_size (int): Connections opened up front and kept open.
+            max_size (int): Maximum number of open connections.
+            idle_timeout (float): Seconds after which an idle connection
+                above min_size is closed.
+            health_check (bool): Check connections when they are borrowed.
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size")
+        self._connect = connect or functools.partial(get_db, backend)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+
+        self._lock = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._borrows = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._closed = False
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+        self._stopped = threading.Event()
+        if min_size < max_size:
+            threading.Thread(
+                target=ConnectionPool._reap,
+                args=(weakref.ref(self), self._stopped,
+                      max(idle_timeout / 2, 0.1)),
+                daemon=True
+            ).start()
+
+    def acquire(self, timeout: float = None):
+        """
+        Borrow a connection, waiting for one to be released if the pool
+        is at max_size.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+            A DB-API connection, to be given back with release.
+        """
+        start = time.monotonic()
+        while True:
+            connection = self._reserve(start, timeout)
+            if connection is None:
+                try:
+                    connection = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+            elif self.health_check and not self._is_alive(connection):
+                self._discard(connection)
+                continue
+            break
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self._in_use += 1
+            self._borrows += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return connection
+
+    def release(self, connection) -> None:
+        """
+        Give a borrowed connection back to the pool, rolling back any
+        transaction it left open so the next borrower does not inherit
+        it. A connection that cannot roll back is dropped.
+
+        Args:
+            connection: A connection returned by acquire.
+        """
+        try:
+            connection.rollback()
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+            self._discard(connection)
+            return
+
+        with self._lock:
+            self._in_use -= 1
+            if self._closed:
+                self._size -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+                self._lock.notify()
+                connection = None
+        if connection is not None:
+            connection.close()
+
+    @contextlib.contextmanager
+    def connection(self, timeout: float = None) -> Iterator:
+        """
+        Borrow a connection for the duration of a with block.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait.
+
+        Yields:
+            A DB-API connection.
+        """
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(self) -> None:
+        """
+        Close every idle connection; borrowed ones are closed on release.
+        """
+        self._stopped.set()
+        with self._lock:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._lock.notify_all()
+        for connection in idle:
+            connection.close()
+
+    def metrics(self) -> Dict:
+        """
+        Report the pool usage.
+
+        Returns:
+            Dict: Open, idle and in-use connections, number of borrows and
+            the average and maximum borrow wait in seconds.
+        """
+        with self._lock:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "borrows": self._borrows,
+                "wait_avg": self._wait_total / (self._borrows or 1),
+                "wait_max": self._wait_max,
+            }
+
+    def _reserve(self, start: float, timeout: float):
+        """
+        Take an idle connection, or reserve a slot for a new one.
+
+        Args:
+            start (float): Monotonic time at which acquire was called.
+            timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+            An idle connection, or None if the caller must open one.
+        """
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                self._prune()
+                if self._idle:
+                    return self._idle.pop()[0]
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None
+                remaining = None
+                if timeout is not None:
+                    remaining = timeout - (time.monotonic() - start)
+                    if remaining <= 0:
+                        raise TimeoutError("No database connection available")
+                self._lock.wait(remaining)
+
+    def _prune(self) -> None:
+        """
+        Close connections idle for longer than idle_timeout. The lock must
+        be held by the caller.
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        while (self._idle and self._size > self.min_size
+               and self._idle[0][1] < deadline):
+            connection, _ = self._idle.popleft()
+            self._size -= 1
+            connection.close()
+
+    @staticmethod
+    def _reap(pool_ref: weakref.ref, stopped: threading.Event,
+              interval: float) -> None:
+        """
+        Reaper thread: prune the idle connections every interval seconds
+        until the pool is closed or garbage collected.
+
+        Args:
+            pool_ref (weakref.ref): Weak reference to the pool, so the
+                thread does not keep it alive.
+            stopped (threading.Event): Set when the pool is closed.
+            interval (float): Seconds between two prunes.
+        """
+        while not stopped.wait(interval):
+            pool = pool_ref()
+            if pool is None:
+                return
+            with pool._lock:
+                pool._prune()
+            del pool
+
+    def _discard(self, connection) -> None:
+        """
+        Drop a broken connection from the pool.
+
+        Args:
+            connection: The connection to drop.
+        """
+        with self._lock:
+            self._size -= 1
+            self._lock.notify()
+        with contextlib.suppress(Exception):
+            connection.close()
+
+    @staticmethod
+    def _is_alive(connection) -> bool:
+        """
+        Check that a connection can still run a query.
+
+        Args:
+            connection: The connection to check.
+
+        Returns:
+            bool: True if "SELECT 1" succeeds.
+        """
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
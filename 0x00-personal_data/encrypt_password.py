@@ -2,20 +2,28 @@
 """
 Module for hashing and validating passwords.
 """
+import functools
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Tuple
+
 import bcrypt
 
 
-def hash_password(password: str) -> bytes:
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     Generate a salted, hashed password.
 
     Args:
         password (str): The plain text password to hash.
+        rounds (int): The bcrypt cost factor, target_rounds() if None.
 
     Returns:
         bytes: The salted, hashed password as a byte string.
     """
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds or target_rounds())
     hashed_password = bcrypt.hashpw(password.encode(), salt)
 
     return hashed_password
@@ -33,3 +41,182 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         bool: True if the password matches the hashed password,False otherwise.
     """
     return bcrypt.checkpw(password.encode(), hashed_password)
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    """
+    Read the cost factor of a bcrypt hash.
+
+    Args:
+        hashed_password (bytes): A hash such as b"$2b$12$...".
+
+    Returns:
+        int: The cost factor the hash was made with.
+    """
+    return int(hashed_password.split(b"$")[2])
+
+
+def calibrate_rounds(
+    budget_ms: float, min_rounds: int = 4, max_rounds: int = 16
+) -> int:
+    """
+    Find the highest bcrypt cost factor hashing within a time budget on
+    this machine.
+
+    Every extra round doubles the work, so the time measured at
+    min_rounds gives an estimate. The estimate is then timed, and the
+    cost stepped down one round at a time while it is over the budget;
+    each timing is the fastest of three hashes. The same function is
+    copied as _calibrate_rounds in 0x03-user_authentication_service/
+    auth.py, keep the two in sync.
+
+    Args:
+        budget_ms (float): Maximum milliseconds for one hash.
+        min_rounds (int): Lowest cost factor returned.
+        max_rounds (int): Highest cost factor returned.
+
+    Returns:
+        int: The cost factor to use.
+    """
+    def measure(rounds: int) -> float:
+        """Milliseconds taken by the fastest of three hashes."""
+        salt = bcrypt.gensalt(rounds)
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            bcrypt.hashpw(b"calibration", salt)
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
+
+    base = measure(min_rounds)
+    rounds = min_rounds
+    while rounds < max_rounds:
+        if base * 2 ** (rounds + 1 - min_rounds) > budget_ms:
+            break
+        rounds += 1
+    while rounds > min_rounds and measure(rounds) > budget_ms:
+        rounds -= 1
+    return rounds
+
+
+@functools.lru_cache(maxsize=1)
+def target_rounds() -> int:
+    """
+    The cost factor new hashes should use: BCRYPT_ROUNDS if it is set,
+    otherwise calibrated against BCRYPT_BUDGET_MS if that is set,
+    otherwise bcrypt's default of 12. Copied as _target_rounds in
+    0x03-user_authentication_service/auth.py.
+
+    Returns:
+        int: The cost factor.
+    """
+    if os.environ.get("BCRYPT_ROUNDS"):
+        return int(os.environ["BCRYPT_ROUNDS"])
+    if os.environ.get("BCRYPT_BUDGET_MS"):
+        return calibrate_rounds(float(os.environ["BCRYPT_BUDGET_MS"]))
+    return 12
+
+
+def check_password(
+    hashed_password: bytes, password: str, rounds: int = None
+) -> Tuple[bool, bool]:
+    """
+    Validate a password and report whether its hash should be upgraded.
+
+    Args:
+        hashed_password (bytes): The hashed password.
+        password (str): The plain text password to validate.
+        rounds (int): The wanted cost factor, target_rounds() if None.
+
+    Returns:
+        Tuple[bool, bool]: Whether the password is valid, and whether it
+        is valid but hashed with another cost factor, in which case the
+        caller should store hash_password(password, rounds) instead.
+    """
+    if not is_valid(hashed_password, password):
+        return False, False
+    rounds = rounds or target_rounds()
+    return True, hash_rounds(hashed_password) != rounds
+
+
+def _is_valid_pair(pair: Tuple[bytes, str]) -> bool:
+    """
+    Validate a (hashed_password, password) pair with is_valid.
+
+    Args:
+        pair (Tuple[bytes, str]): The hashed and plain text passwords.
+
+    Returns:
+        bool: True if the password matches the hashed password.
+    """
+    return is_valid(*pair)
+
+
+def _ordered_map(
+    function: Callable, iterable: Iterable, workers: int, processes: bool
+) -> Iterator:
+    """
+    Apply a function to every item in a pool, yielding results in input
+    order while keeping at most 2 * workers items in flight.
+
+    Args:
+        function (Callable): Picklable function to apply.
+        iterable (Iterable): The inputs, consumed lazily.
+        workers (int): Number of workers, the CPU count if None.
+        processes (bool): Use processes instead of threads.
+
+    Yields:
+        The result of function for each input.
+    """
+    workers = workers or os.cpu_count() or 1
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor_class(workers) as executor:
+        window = 2 * workers
+        pending = deque()
+        for item in iterable:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def hash_passwords(
+    passwords: Iterable[str], workers: int = None, processes: bool = False,
+    rounds: int = None
+) -> Iterator[bytes]:
+    """
+    Hash many passwords in parallel. bcrypt releases the GIL, so threads
+    use every core; processes are available as well.
+
+    Args:
+        passwords (Iterable[str]): The plain text passwords.
+        workers (int): Number of workers, the CPU count if None.
+        processes (bool): Use a process pool instead of threads.
+        rounds (int): The bcrypt cost factor, target_rounds() if None.
+
+    Yields:
+        bytes: The hashed passwords, in input order.
+    """
+    function = functools.partial(hash_password,
+                                 rounds=rounds or target_rounds())
+    return _ordered_map(function, passwords, workers, processes)
+
+
+def verify_many(
+    pairs: Iterable[Tuple[bytes, str]], workers: int = None,
+    processes: bool = False
+) -> Iterator[bool]:
+    """
+    Validate many (hashed_password, password) pairs in parallel.
+
+    Args:
+        pairs (Iterable[Tuple[bytes, str]]): Hashes with their candidate
+            plain text passwords.
+        workers (int): Number of workers, the CPU count if None.
+        processes (bool): Use a process pool instead of threads.
+
+    Yields:
+        bool: Whether each password matches its hash, in input order.
+    """
+    return _ordered_map(_is_valid_pair, pairs, workers, processes)
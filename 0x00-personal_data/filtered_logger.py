@@ -2,16 +2,205 @@
 """
 Module for filtering Personally Identifiable Information (PII) in logs.
 """
+import atexit
+import copy
+import functools
+import json
 import logging
+import logging.handlers
+import multiprocessing
 import os
+import queue
+import random
 import re
-from typing import List
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import (
+    Callable, Dict, Iterator, List, Mapping, Optional, Sequence, TextIO,
+    Tuple, Union
+)
 
 import mysql.connector
-from mysql.connector.cursor import MySQLCursorDict
 
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+OUTPUT_FORMATS = ("text", "json")
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+REGEX_SPECIAL = frozenset("\\.^$*+?{}[]|()")
+TRIE_MIN_FIELDS = 64
+
+
+def _is_literal(text: str) -> bool:
+    """
+    Checks whether a string means the same thing as a regex and as text.
+
+    Args:
+        text (str): The string to check.
+
+    Returns:
+        bool: True if the string contains no regex metacharacters.
+    """
+    return not REGEX_SPECIAL.intersection(text)
+
+
+class FieldTrie:
+    """
+    Redactor for large field dictionaries, used by compile_redactor.
+
+    The message is scanned left to right for "=". At each one, a trie of
+    the reversed field names is walked backwards to find the longest field
+    name ending there, so the cost per "=" depends on the length of the
+    field names, not on how many there are. The matches are the same as
+    the per-field regexes of filter_datum would find.
+    """
+
+    END = ""
+
+    def __init__(
+        self, fields: Tuple[str, ...], redaction: str, separator: str,
+        fallback: Callable[[str], str]
+    ):
+        """
+        Initialize the FieldTrie.
+
+        Args:
+            fields (Tuple[str, ...]): PII fields to obfuscate, literal
+                names without "=".
+            redaction (str): The string to replace PII fields with.
+            separator (str): The separator used in the log messages.
+            fallback (Callable[[str], str]): Redactor used for messages
+                with an empty value such as "name=;", where a field's
+                match can run over the next field.
+        """
+        self.root = {}
+        for field in fields:
+            node = self.root
+            for char in reversed(field):
+                node = node.setdefault(char, {})
+            node[self.END] = True
+        self.separator = separator
+        self.replacement = f"={redaction}{separator}"
+        self.empty_value = f"={separator}"
+        self.fallback = fallback
+
+    def key_start(self, message: str, equal: int, low: int) -> int:
+        """
+        Find where the longest field name ending right before an "=" starts.
+
+        Args:
+            message (str): The log message.
+            equal (int): Index of the "=".
+            low (int): Lowest index the field name may start at.
+
+        Returns:
+            int: The start index, or -1 if no field name ends there.
+        """
+        node = self.root
+        start = -1
+        for index in range(equal - 1, low - 1, -1):
+            node = node.get(message[index])
+            if node is None:
+                break
+            if self.END in node:
+                start = index
+        return start
+
+    def __call__(self, message: str) -> str:
+        """
+        Obfuscate the PII fields of a message.
+
+        Args:
+            message (str): The log message containing PII.
+
+        Returns:
+            str: The obfuscated log message.
+        """
+        if self.empty_value in message:
+            return self.fallback(message)
+
+        separator = self.separator
+        parts = []
+        cursor = 0
+        equal = message.find("=")
+        while equal != -1:
+            start = self.key_start(message, equal, cursor)
+            end = message.find(separator, equal + 2) if start != -1 else -1
+            if end == -1 or message.find("\n", equal + 1, end) != -1:
+                equal = message.find("=", equal + 1)
+                continue
+            parts.append(message[cursor:equal])
+            parts.append(self.replacement)
+            cursor = end + len(separator)
+            equal = message.find("=", cursor)
+        parts.append(message[cursor:])
+        return "".join(parts)
+
+
+@functools.lru_cache(maxsize=64)
+def compile_redactor(
+    fields: Tuple[str, ...], redaction: str, separator: str
+) -> Callable[[str], str]:
+    """
+    Builds a function that obfuscates PII fields in a message.
+
+    The per-field patterns and replacements are compiled once and reused
+    for every message. Each pattern starts with the field name, which
+    lets the regex engine skip straight to its candidates; folding the
+    fields into one alternation loses that and was measured to be slower
+    for dictionaries of this size. From TRIE_MIN_FIELDS literal fields
+    on, a FieldTrie scans the message once instead.
+
+    Args:
+        fields (Tuple[str, ...]): PII fields to obfuscate.
+        redaction (str): The string to replace PII fields with.
+        separator (str): The separator used in the log messages.
+
+    Returns:
+        Callable[[str], str]: Function redacting a single message, with
+        the same output as the original filter_datum.
+    """
+    substitutions = None
+    lock = threading.Lock()
+
+    def compiled() -> List[Tuple[Callable, str]]:
+        """
+        Compiles the patterns on first use, under a lock, and publishes
+        the complete list in a single assignment so that no thread ever
+        sees part of it.
+        """
+        nonlocal substitutions
+        if substitutions is None:
+            with lock:
+                if substitutions is None:
+                    substitutions = [
+                        (re.compile(f"{field}=.+?{separator}").sub,
+                         f"{field}={redaction}{separator}")
+                        for field in fields
+                    ]
+        return substitutions
+
+    def redact(message: str) -> str:
+        """Obfuscates the fields one substitution at a time."""
+        for substitute, replacement in compiled():
+            message = substitute(replacement, message)
+        return message
+
+    use_trie = (
+        len(fields) >= TRIE_MIN_FIELDS and separator and redaction
+        and all(field and "=" not in field and _is_literal(field)
+                for field in fields)
+        and _is_literal(separator) and "\\" not in redaction
+        and "=" not in redaction and separator not in redaction
+    )
+    if use_trie:
+        return FieldTrie(fields, redaction, separator, redact)
+    compiled()
+    return redact
 
 
 def filter_datum(
@@ -29,13 +218,7 @@ def filter_datum(
     Returns:
         str: The obfuscated log message.
     """
-    for field in fields:
-        message = re.sub(
-            f"{field}=.+?{separator}",
-            f"{field}={redaction}{separator}",
-            message
-        )
-    return message
+    return compile_redactor(tuple(fields), redaction, separator)(message)
 
 
 class RedactingFormatter(logging.Formatter):
@@ -47,36 +230,519 @@ class RedactingFormatter(logging.Formatter):
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
 
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str], output: str = "text"):
         """
         Initialize the RedactingFormatter.
 
         Args:
             fields (List[str]): List of PII fields to obfuscate.
+            output (str): "text" for the [HOLBERTON] line format, "json"
+                for one JSON object per line.
         """
+        if output not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output}")
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.output = output
+        self._field_set = frozenset(fields)
+        self._redact = compile_redactor(
+            tuple(fields), self.REDACTION, self.SEPARATOR
+        )
+
+    @staticmethod
+    def structured_data(record: logging.LogRecord) -> Optional[Mapping]:
+        """
+        Get the mapping logged as the message or as extra={"user_data": ...}.
+
+        Args:
+            record (logging.LogRecord): The log record.
+
+        Returns:
+            Optional[Mapping]: The structured data, None for text records.
+        """
+        if isinstance(record.msg, Mapping):
+            return record.msg
+        data = getattr(record, "user_data", None)
+        return data if isinstance(data, Mapping) else None
+
+    def redact_mapping(self, data: Mapping) -> Dict:
+        """
+        Obfuscate the PII keys of a mapping without building any string.
+
+        Args:
+            data (Mapping): Field names mapped to their values.
+
+        Returns:
+            Dict: A copy of the mapping with PII values redacted.
+        """
+        fields = self._field_set
+        return {key: self.REDACTION if key in fields else value
+                for key, value in data.items()}
 
     def format(self, record: logging.LogRecord) -> str:
         """
         Format the log record, obfuscating PII fields.
 
+        A mapping logged as extra={"user_data": ...} is written after the
+        message, as "message; key=value; key=value".
+
         Args:
             record (logging.LogRecord): The log record.
 
         Returns:
             str: The formatted log record with obfuscated PII fields.
         """
-        return filter_datum(
-            self.fields, self.REDACTION,
-            super().format(record), self.SEPARATOR
-        ).rstrip(self.SEPARATOR) + self.SEPARATOR
+        data = self.structured_data(record)
+        if data is not None:
+            data = self.redact_mapping(data)
+        if self.output == "json":
+            return self._format_json(record, data)
+        if data is None:
+            return self._redact(
+                super().format(record)
+            ).rstrip(self.SEPARATOR) + self.SEPARATOR
+
+        message = "; ".join(f"{key}={value}" for key, value in data.items())
+        if not isinstance(record.msg, Mapping):
+            message = self._redact("{}{} {}".format(
+                record.getMessage().rstrip(self.SEPARATOR), self.SEPARATOR,
+                message))
+        if record.exc_info or record.exc_text or record.stack_info:
+            record = copy.copy(record)
+            record.msg, record.args = message, None
+            return self._redact(
+                super().format(record)
+            ).rstrip(self.SEPARATOR) + self.SEPARATOR
+
+        record.message = message
+        if self.usesTime():
+            record.asctime = self.formatTime(record, self.datefmt)
+        return self.formatMessage(record).rstrip(
+            self.SEPARATOR) + self.SEPARATOR
+
+    def _format_json(
+        self, record: logging.LogRecord, data: Optional[Dict]
+    ) -> str:
+        """
+        Format the log record as a single line JSON object.
+
+        A mapping logged as the message is the "message" of the entry,
+        one logged as extra={"user_data": ...} its "data".
+
+        Args:
+            record (logging.LogRecord): The log record.
+            data (Optional[Dict]): The redacted structured data, if any.
+
+        Returns:
+            str: The JSON line with obfuscated PII fields.
+        """
+        entry = {
+            "name": record.name,
+            "levelname": record.levelname,
+            "asctime": self.formatTime(record, self.datefmt),
+        }
+        if isinstance(record.msg, Mapping):
+            entry["message"] = data
+        else:
+            entry["message"] = self._redact(record.getMessage())
+            if data is not None:
+                entry["data"] = data
+        if record.exc_info:
+            entry["exc_info"] = self._redact(
+                self.formatException(record.exc_info))
+        return json.dumps(entry, default=str)
+
+    def format_batch(self, records: List[logging.LogRecord]) -> List[str]:
+        """
+        Format several log records, redacting them all with one call.
+
+        The formatted records are joined with newlines, which the
+        redaction patterns never cross, so the result is the same as
+        calling format on each record. Structured records and the json
+        output are formatted one by one, as they need no scan.
+
+        Args:
+            records (List[logging.LogRecord]): The log records.
+
+        Returns:
+            List[str]: The formatted records with obfuscated PII fields.
+        """
+        if self.output != "text" or any(
+            self.structured_data(record) is not None for record in records
+        ):
+            return [self.format(record) for record in records]
+
+        texts = [super(RedactingFormatter, self).format(record)
+                 for record in records]
+        if any("\n" in text for text in texts):
+            texts = [self._redact(text) for text in texts]
+        elif texts:
+            texts = self._redact("\n".join(texts)).split("\n")
+        return [text.rstrip(self.SEPARATOR) + self.SEPARATOR
+                for text in texts]
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that applies an overflow policy when its queue is full.
+
+    Records are put on the queue as they are; formatting and redaction
+    are left to the BatchingListener thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = "block"):
+        """
+        Initialize the BoundedQueueHandler.
+
+        Args:
+            log_queue (queue.Queue): Bounded queue shared with the listener.
+            overflow (str): One of "block", "drop_oldest" or "drop_newest".
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Merge the message arguments so the record can be formatted later.
+        Structured messages are kept as they are.
+
+        Args:
+            record (logging.LogRecord): The log record.
+
+        Returns:
+            logging.LogRecord: The record to enqueue.
+        """
+        if not isinstance(record.msg, Mapping):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """
+        Put a record on the queue according to the overflow policy.
+
+        Args:
+            record (logging.LogRecord): The prepared log record.
+        """
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                self.dropped += 1
+                if self.overflow == "drop_newest":
+                    return
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+
+class BatchingListener:
+    """
+    Background thread that formats queued records and writes them in
+    batches to the stream of a handler.
+    """
+
+    def __init__(
+        self, log_queue: queue.Queue, handler: logging.StreamHandler,
+        batch_size: int = 256
+    ):
+        """
+        Initialize the BatchingListener.
+
+        Args:
+            log_queue (queue.Queue): Queue filled by a BoundedQueueHandler.
+            handler (logging.StreamHandler): Handler whose formatter and
+                stream are used for the output.
+            batch_size (int): Maximum number of records per write.
+        """
+        self.queue = log_queue
+        self.handler = handler
+        self.batch_size = batch_size
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Start the background thread.
+        """
+        self._thread = threading.Thread(target=self._monitor, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Write every queued record and stop the background thread.
+        """
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _monitor(self) -> None:
+        """
+        Drain the queue until the stop sentinel is received.
+        """
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                running = False
+                batch.pop()
+            self._write(batch)
+
+    def _write(self, batch: List[logging.LogRecord]) -> None:
+        """
+        Format a batch of records and write them with a single call.
+
+        Errors are reported with handleError, like StreamHandler.emit
+        does, so that the thread keeps draining the queue.
+
+        Args:
+            batch (List[logging.LogRecord]): Records to write.
+        """
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.handler.format(record)
+                             + self.handler.terminator)
+            except Exception:
+                self.handler.handleError(record)
+        if not lines:
+            return
+        self.handler.acquire()
+        try:
+            self.handler.stream.write("".join(lines))
+            self.handler.flush()
+        except Exception:
+            self.handler.handleError(batch[-1])
+        finally:
+            self.handler.release()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Handler filter dropping records before they are formatted.
+
+    Attached to the handler, it also sees the records propagated from
+    child loggers such as "user_data.api". Records are first sampled by
+    level and by logger name, then every message template (the
+    unformatted msg) is rate-limited with its own token bucket. The
+    number of dropped records is reported at most once per
+    summary_interval by a WARNING record on the same logger, by the next
+    record or by a timer once the interval is over, and by flush().
+    """
+
+    MAX_TEMPLATES = 1024
+
+    def __init__(
+        self, level_rates: Dict[int, float] = None,
+        logger_rates: Dict[str, float] = None, rate: float = None,
+        burst: int = 10, summary_interval: float = 60.0
+    ):
+        """
+        Initialize the SamplingFilter.
+
+        Args:
+            level_rates (Dict[int, float]): Share of records kept per
+                level, e.g. {logging.INFO: 0.01, logging.WARNING: 1.0}.
+                A record uses the rate of the highest level not above
+                its own; levels below all of them are kept.
+            logger_rates (Dict[str, float]): Share of records kept per
+                logger name, applied on top of level_rates. A name also
+                covers its child loggers that have no rate of their own.
+            rate (float): Records per second allowed for each message
+                template, no limit if None.
+            burst (int): Records a template may log at once before the
+                rate applies.
+            summary_interval (float): Minimum seconds between two
+                summaries of suppressed records.
+        """
+        super().__init__()
+        self.level_rates = sorted((level_rates or {}).items())
+        self.logger_rates = logger_rates or {}
+        self.rate = rate
+        self.burst = burst
+        self.summary_interval = summary_interval
+        self.suppressed = 0
+        self._buckets = OrderedDict()
+        self._last_summary = time.monotonic()
+        self._summary_logger = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def sample_rate(self, record: logging.LogRecord) -> float:
+        """
+        Get the share of records like this one that are kept.
+
+        Args:
+            record (logging.LogRecord): The log record.
+
+        Returns:
+            float: A rate between 0 and 1.
+        """
+        rate = 1.0
+        for level, level_rate in self.level_rates:
+            if level > record.levelno:
+                break
+            rate = level_rate
+        name = record.name
+        while name not in self.logger_rates and "." in name:
+            name = name.rsplit(".", 1)[0]
+        return rate * self.logger_rates.get(name, 1.0)
+
+    def _take_token(self, record: logging.LogRecord, now: float) -> bool:
+        """
+        Take a token from the bucket of the record's template. The lock
+        must be held by the caller.
+
+        Args:
+            record (logging.LogRecord): The log record.
+            now (float): The current monotonic time.
+
+        Returns:
+            bool: True if the bucket had a token left.
+        """
+        msg = record.msg
+        template = (record.name, record.levelno,
+                    msg if isinstance(msg, str) else
+                    (type(msg).__name__,
+                     tuple(msg) if isinstance(msg, Mapping) else None))
+        tokens, updated = self._buckets.pop(template, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1
+        self._buckets[template] = (tokens - 1 if allowed else tokens, now)
+        if len(self._buckets) > self.MAX_TEMPLATES:
+            self._buckets.popitem(last=False)
+        return allowed
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Decide whether a record is logged.
+
+        Args:
+            record (logging.LogRecord): The log record.
+
+        Returns:
+            bool: True to log the record, False to drop it.
+        """
+        if getattr(record, "suppression_summary", False):
+            return True
+
+        now = time.monotonic()
+        rate = self.sample_rate(record)
+        with self._lock:
+            allowed = rate >= 1 or random.random() < rate
+            if allowed and self.rate is not None:
+                allowed = self._take_token(record, now)
+            if not allowed:
+                self.suppressed += 1
+                self._summary_logger = record.name
+            summary = None
+            if now - self._last_summary >= self.summary_interval:
+                summary = self._take_summary(now)
+            elif not allowed and self._timer is None:
+                self._timer = threading.Timer(
+                    self._last_summary + self.summary_interval - now,
+                    self._on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+        self._emit(summary)
+        return allowed
+
+    def _take_summary(self, now: float) -> Optional[Tuple]:
+        """
+        Take the pending summary and start a new interval. The lock must
+        be held by the caller.
+
+        Args:
+            now (float): The current monotonic time.
+
+        Returns:
+            Optional[Tuple]: The logger name, the number of suppressed
+            records and the seconds they were counted over, None if no
+            record was suppressed.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.suppressed:
+            return None
+        summary = (self._summary_logger, self.suppressed,
+                   now - self._last_summary)
+        self.suppressed = 0
+        self._last_summary = now
+        return summary
+
+    def _emit(self, summary: Optional[Tuple]) -> None:
+        """
+        Log a summary taken by _take_summary as a WARNING record.
+
+        Args:
+            summary (Optional[Tuple]): The summary, nothing is logged if
+                None.
+        """
+        if summary is None:
+            return
+        name, suppressed, elapsed = summary
+        logging.getLogger(name).handle(logging.makeLogRecord({
+            "name": name,
+            "levelno": logging.WARNING,
+            "levelname": logging.getLevelName(logging.WARNING),
+            "msg": "%d records suppressed in the last %.1fs",
+            "args": (suppressed, elapsed),
+            "suppression_summary": True,
+        }))
+
+    def _on_timer(self) -> None:
+        """
+        Report the records suppressed once the interval is over, when no
+        record came to do it.
+        """
+        with self._lock:
+            self._timer = None
+            summary = self._take_summary(time.monotonic())
+        self._emit(summary)
+
+    def flush(self) -> None:
+        """
+        Report the records suppressed since the last summary now.
+        """
+        with self._lock:
+            summary = self._take_summary(time.monotonic())
+        self._emit(summary)
 
 
-def get_logger() -> logging.Logger:
+def get_logger(
+    asynchronous: bool = False, queue_size: int = 10000,
+    overflow: str = "block", output: str = "text",
+    sampler: SamplingFilter = None
+) -> logging.Logger:
     """
     Creates and configures a logger for user data with PII redaction.
 
+    Args:
+        asynchronous (bool): Queue records and redact them on a background
+            thread instead of in the calling thread.
+        queue_size (int): Maximum number of queued records.
+        overflow (str): What to do when the queue is full: "block" the
+            caller, "drop_oldest" or "drop_newest" record.
+        output (str): "text" or "json" lines, see RedactingFormatter.
+        sampler (SamplingFilter): Sampling and rate limiting applied
+            before any formatting.
+
     Returns:
         logging.Logger: Configured logger with redaction formatter.
     """
@@ -85,47 +751,378 @@ def get_logger() -> logging.Logger:
     logger.propagate = False
 
     stream_handler = logging.StreamHandler()
-    formatter = RedactingFormatter(list(PII_FIELDS))
+    formatter = RedactingFormatter(list(PII_FIELDS), output)
     stream_handler.setFormatter(formatter)
-    logger.addHandler(stream_handler)
+
+    if not asynchronous:
+        handler = stream_handler
+    else:
+        log_queue = queue.Queue(queue_size)
+        handler = BoundedQueueHandler(log_queue, overflow)
+        handler.listener = BatchingListener(log_queue, stream_handler)
+        handler.listener.start()
+        atexit.register(handler.listener.stop)
+
+    if sampler is not None:
+        handler.addFilter(sampler)
+        atexit.register(sampler.flush)
+    logger.addHandler(handler)
 
     return logger
 
 
-def get_db() -> mysql.connector.connection.MySQLConnection:
+def get_db(backend: str = None) -> Union[
+    mysql.connector.connection.MySQLConnection, sqlite3.Connection
+]:
     """
     Establishes a connection to the database.
 
+    Args:
+        backend (str): DB-API driver to use, "mysql" or "sqlite3".
+            Defaults to PERSONAL_DATA_DB_BACKEND, then "mysql".
+
     Returns:
         Database connection object.
     """
+    backend = backend or os.environ.get("PERSONAL_DATA_DB_BACKEND", "mysql")
+    if backend == "sqlite3":
+        return sqlite3.connect(
+            os.environ.get("PERSONAL_DATA_DB_NAME", ":memory:"),
+            check_same_thread=False
+        )
+    if backend != "mysql":
+        raise ValueError(f"Unknown database backend: {backend}")
+
     connection = mysql.connector.connection.MySQLConnection(
         user=os.environ.get("PERSONAL_DATA_DB_USERNAME", "root"),
         password=os.environ.get("PERSONAL_DATA_DB_PASSWORD", ""),
         host=os.environ.get("PERSONAL_DATA_DB_HOST", "localhost"),
         database=os.environ.get("PERSONAL_DATA_DB_NAME"),
-        port=3306
+        port=int(os.environ.get("PERSONAL_DATA_DB_PORT", 3306))
     )
 
     return connection
 
 
+def format_row(row: Dict) -> str:
+    """
+    Builds the log message for a row of the users table.
+
+    Args:
+        row (Dict): Column names mapped to their values.
+
+    Returns:
+        str: The row as "column=value; column=value".
+    """
+    return "; ".join(f"{key}={value}" for key, value in row.items())
+
+
+def stream_rows(
+    db_connection, query: str, batch_size: int = 1000,
+    params: Sequence = ()
+) -> Iterator[List[Dict]]:
+    """
+    Runs a query on an unbuffered cursor and yields its rows in batches.
+
+    Args:
+        db_connection: A DB-API connection (MySQL or sqlite3).
+        query (str): The SELECT statement to run.
+        batch_size (int): Number of rows fetched at a time.
+        params (Sequence): Values bound to the query placeholders.
+
+    Yields:
+        List[Dict]: The next batch of rows as column name to value dicts.
+    """
+    try:
+        cursor = db_connection.cursor(buffered=False)
+    except TypeError:
+        cursor = db_connection.cursor()
+    try:
+        cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [dict(zip(columns, row)) for row in rows]
+    finally:
+        cursor.close()
+
+
+def _write_rows(
+    stream: TextIO, batches: Iterator[List[Dict]], output: str = "text"
+) -> int:
+    """
+    Formats batches of users rows and writes the redacted lines.
+
+    Args:
+        stream (TextIO): Where to write the lines.
+        batches (Iterator[List[Dict]]): Batches of rows, as stream_rows.
+        output (str): "text" or "json" lines, see RedactingFormatter.
+            JSON lines hold each row as structured data, like main's
+            default mode.
+
+    Returns:
+        int: Number of rows written.
+    """
+    formatter = RedactingFormatter(list(PII_FIELDS), output)
+    logger = logging.getLogger("user_data")
+    count = 0
+
+    for batch in batches:
+        records = [
+            logger.makeRecord(logger.name, logging.INFO, __file__, 0,
+                              format_row(row) if output == "text" else row,
+                              None, None)
+            for row in batch
+        ]
+        stream.write("".join(
+            line + "\n" for line in formatter.format_batch(records)
+        ))
+        count += len(batch)
+
+    stream.flush()
+    return count
+
+
+def users_projection(
+    db_connection, fields: Sequence[str] = PII_FIELDS
+) -> str:
+    """
+    Builds a column list for the users table where PII columns are
+    replaced by the redaction in the database, so their values are
+    never sent to the client.
+
+    Args:
+        db_connection: A DB-API connection (MySQL or sqlite3).
+        fields (Sequence[str]): The PII columns.
+
+    Returns:
+        str: The projection, such as "'***' AS `name`, `ip`".
+    """
+    cursor = db_connection.cursor()
+    cursor.execute("SELECT * FROM users WHERE 1 = 0;")
+    columns = [column[0] for column in cursor.description]
+    cursor.fetchall()
+    cursor.close()
+
+    projection = []
+    for column in columns:
+        if "`" in column:
+            raise ValueError(f"Invalid column name: {column}")
+        if column in fields:
+            projection.append(
+                f"'{RedactingFormatter.REDACTION}' AS `{column}`")
+        else:
+            projection.append(f"`{column}`")
+    return ", ".join(projection)
+
+
+def export_users(
+    db_connection, stream: TextIO = None, batch_size: int = 1000,
+    pushdown: bool = False, output: str = "text"
+) -> Tuple[int, float]:
+    """
+    Writes every row of the users table to a stream, redacted batch by
+    batch so memory use does not depend on the size of the table.
+
+    Args:
+        db_connection: A DB-API connection (MySQL or sqlite3).
+        stream (TextIO): Where to write the lines, stderr by default.
+        batch_size (int): Number of rows fetched and redacted at a time.
+        pushdown (bool): Redact the PII columns in the query, see
+            users_projection.
+        output (str): "text" or "json" lines, see RedactingFormatter.
+
+    Returns:
+        Tuple[int, float]: Number of rows written and elapsed seconds.
+    """
+    start = time.perf_counter()
+    columns = users_projection(db_connection) if pushdown else "*"
+    count = _write_rows(
+        stream or sys.stderr,
+        stream_rows(db_connection, f"SELECT {columns} FROM users;",
+                    batch_size),
+        output
+    )
+    return count, time.perf_counter() - start
+
+
+def _placeholder(db_connection) -> str:
+    """
+    Returns the parameter placeholder of a connection's DB-API driver.
+
+    Args:
+        db_connection: A DB-API connection (MySQL or sqlite3).
+
+    Returns:
+        str: "?" for qmark drivers, "%s" otherwise.
+    """
+    driver = sys.modules[type(db_connection).__module__.split(".")[0]]
+    return "?" if getattr(driver, "paramstyle", "") == "qmark" else "%s"
+
+
+def shard_ranges(
+    db_connection, shards: int, key: str = "id"
+) -> List[Tuple[int, int]]:
+    """
+    Splits the users table into contiguous primary key ranges.
+
+    Args:
+        db_connection: A DB-API connection (MySQL or sqlite3).
+        shards (int): Number of ranges wanted.
+        key (str): Integer key column of the users table.
+
+    Returns:
+        List[Tuple[int, int]]: Half-open [low, high) key ranges.
+    """
+    if not key.isidentifier():
+        raise ValueError(f"Invalid key column: {key}")
+    cursor = db_connection.cursor()
+    cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM users;")
+    low, high = cursor.fetchone()
+    cursor.close()
+    if low is None:
+        return []
+
+    step = max(1, -(-(high - low + 1) // shards))
+    return [(start, min(start + step, high + 1))
+            for start in range(low, high + 1, step)]
+
+
+def _export_shard(task: Tuple) -> Tuple[str, int]:
+    """
+    Worker process: writes the redacted rows of one key range to a file.
+
+    Args:
+        task (Tuple): (connect, key, low, high, path, batch_size,
+            pushdown, output).
+
+    Returns:
+        Tuple[str, int]: The file written and its number of rows.
+    """
+    connect, key, low, high, path, batch_size, pushdown, output = task
+    db_connection = connect()
+    mark = _placeholder(db_connection)
+    columns = users_projection(db_connection) if pushdown else "*"
+    query = (f"SELECT {columns} FROM users WHERE {key} >= {mark} "
+             f"AND {key} < {mark} ORDER BY {key};")
+    try:
+        with open(path, "w") as shard_file:
+            count = _write_rows(shard_file, stream_rows(
+                db_connection, query, batch_size, (low, high)), output)
+    finally:
+        db_connection.close()
+    return path, count
+
+
+def export_users_parallel(
+    connect: Callable = get_db, workers: int = None, key: str = "id",
+    stream: TextIO = None, output_dir: str = None, batch_size: int = 1000,
+    pushdown: bool = False, output: str = "text"
+) -> Tuple[int, float]:
+    """
+    Exports the users table with one worker process per key range.
+
+    Every worker opens its own connection with connect and redacts its
+    rows with RedactingFormatter. The shards are either concatenated in
+    key order to the stream, or kept as users.<n>.log files in
+    output_dir.
+
+    Args:
+        connect (Callable): Picklable function returning a connection.
+        workers (int): Number of processes, the CPU count by default.
+        key (str): Integer key column used to split the table.
+        stream (TextIO): Where to write the merged lines, stderr by
+            default. Ignored when output_dir is given.
+        output_dir (str): Directory for per-shard files.
+        batch_size (int): Number of rows fetched and redacted at a time.
+        pushdown (bool): Redact the PII columns in the query, see
+            users_projection.
+        output (str): "text" or "json" lines, see RedactingFormatter.
+
+    Returns:
+        Tuple[int, float]: Number of rows written and elapsed seconds.
+    """
+    start = time.perf_counter()
+    workers = workers or os.cpu_count()
+    db_connection = connect()
+    try:
+        ranges = shard_ranges(db_connection, workers, key)
+    finally:
+        db_connection.close()
+
+    shard_dir = output_dir or tempfile.mkdtemp(prefix="users_export_")
+    tasks = [
+        (connect, key, low, high,
+         os.path.join(shard_dir, f"users.{n}.log"), batch_size, pushdown,
+         output)
+        for n, (low, high) in enumerate(ranges)
+    ]
+
+    count = 0
+    stream = stream or sys.stderr
+    try:
+        with multiprocessing.Pool(workers) as pool:
+            for path, rows in pool.imap(_export_shard, tasks):
+                count += rows
+                if output_dir is None:
+                    with open(path) as shard_file:
+                        shutil.copyfileobj(shard_file, stream)
+                    os.remove(path)
+    finally:
+        if output_dir is None:
+            shutil.rmtree(shard_dir, ignore_errors=True)
+
+    stream.flush()
+    return count, time.perf_counter() - start
+
+
 def main() -> None:
     """
     Obtain a database connection using get_db and retrieve all rows
     in the users table and display each row under a filtered format
+
+    Setting PERSONAL_DATA_EXPORT_MODE to "stream" fetches and redacts
+    the rows in batches of PERSONAL_DATA_BATCH_SIZE instead, and
+    "parallel" splits the table on PERSONAL_DATA_SHARD_KEY across
+    PERSONAL_DATA_WORKERS processes, writing per-shard files to
+    PERSONAL_DATA_OUTPUT_DIR when it is set. PERSONAL_DATA_LOG_OUTPUT
+    selects the "text" or "json" format of every line. With
+    PERSONAL_DATA_PUSHDOWN set to 1, PII columns are redacted by the
+    query in every mode.
     """
-    db_connection = get_db()
-    cursor: MySQLCursorDict = db_connection.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM users;")
-    logger = get_logger()
+    output = os.environ.get("PERSONAL_DATA_LOG_OUTPUT", "text")
+    logger = get_logger(output=output)
+    mode = os.environ.get("PERSONAL_DATA_EXPORT_MODE")
+    batch_size = int(os.environ.get("PERSONAL_DATA_BATCH_SIZE", 1000))
+    pushdown = os.environ.get("PERSONAL_DATA_PUSHDOWN") == "1"
+
+    if mode == "parallel":
+        count, elapsed = export_users_parallel(
+            workers=int(os.environ.get("PERSONAL_DATA_WORKERS", 0)) or None,
+            key=os.environ.get("PERSONAL_DATA_SHARD_KEY", "id"),
+            output_dir=os.environ.get("PERSONAL_DATA_OUTPUT_DIR"),
+            batch_size=batch_size, pushdown=pushdown, output=output
+        )
+    elif mode == "stream":
+        db_connection = get_db()
+        count, elapsed = export_users(db_connection, batch_size=batch_size,
+                                      pushdown=pushdown, output=output)
+        db_connection.close()
+    else:
+        db_connection = get_db()
+        columns = users_projection(db_connection) if pushdown else "*"
+        for batch in stream_rows(db_connection,
+                                 f"SELECT {columns} FROM users;", batch_size):
+            for row in batch:
+                logger.info(row)
 
-    for row in cursor:
-        log_message = "; ".join(f"{key}={value}" for key, value in row.items())
-        logger.info(log_message)
+        db_connection.close()
+        return
 
-    cursor.close()
-    db_connection.close()
+    logger.info("exported %d rows in %.2fs (%.0f rows/sec)",
+                count, elapsed, count / elapsed if elapsed else 0)
 
 
 if __name__ == "__main__":
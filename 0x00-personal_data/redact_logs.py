@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Command line tool obfuscating PII in existing log files.
+
+The input is memory-mapped and cut into newline-aligned chunks that are
+redacted by a pool of processes with the same rules as filter_datum,
+then written to the output in their original order.
+
+Usage:
+    ./redact_logs.py [-f FIELDS] [-s SEPARATOR] [-r REDACTION] [-j JOBS]
+                     INPUT [OUTPUT]
+"""
+import argparse
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from typing import BinaryIO, Iterator, List, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, compile_redactor
+
+
+_worker = {}
+
+
+def chunk_bounds(
+    data: mmap.mmap, chunk_size: int
+) -> Iterator[Tuple[int, int]]:
+    """
+    Splits a file into chunks ending right after a newline.
+
+    Args:
+        data (mmap.mmap): The memory-mapped file.
+        chunk_size (int): Approximate size of a chunk in bytes.
+
+    Yields:
+        Tuple[int, int]: Start and end offsets of each chunk.
+    """
+    start = 0
+    size = len(data)
+    while start < size:
+        newline = data.find(b"\n", min(start + chunk_size, size) - 1)
+        end = size if newline == -1 else newline + 1
+        yield start, end
+        start = end
+
+
+def _init_worker(
+    path: str, fields: List[str], redaction: str, separator: str
+) -> None:
+    """
+    Maps the input file and builds the redactor once per worker process.
+
+    Args:
+        path (str): The input file.
+        fields (List[str]): PII fields to obfuscate.
+        redaction (str): The string to replace PII fields with.
+        separator (str): The separator used in the log lines.
+    """
+    with open(path, "rb") as log_file:
+        _worker["data"] = mmap.mmap(log_file.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+    _worker["redact"] = compile_redactor(tuple(fields), redaction, separator)
+
+
+def _redact_chunk(bounds: Tuple[int, int]) -> bytes:
+    """
+    Redacts one chunk of the input file in a worker process.
+
+    Args:
+        bounds (Tuple[int, int]): Start and end offsets of the chunk.
+
+    Returns:
+        bytes: The redacted chunk. Bytes that are not UTF-8 are kept as
+        they are.
+    """
+    start, end = bounds
+    text = _worker["data"][start:end].decode("utf-8", "surrogateescape")
+    return _worker["redact"](text).encode("utf-8", "surrogateescape")
+
+
+def redact_file(
+    path: str, output: BinaryIO, fields: List[str], redaction: str,
+    separator: str, jobs: int = None, chunk_size: int = 8 << 20
+) -> int:
+    """
+    Redacts a log file into a binary stream using a process pool.
+
+    At most 2 * jobs chunks are in flight, so memory use depends on the
+    chunk size and not on the size of the file.
+
+    Args:
+        path (str): The input file.
+        output (BinaryIO): Where to write the redacted file.
+        fields (List[str]): PII fields to obfuscate.
+        redaction (str): The string to replace PII fields with.
+        separator (str): The separator used in the log lines.
+        jobs (int): Number of worker processes, the CPU count if None.
+        chunk_size (int): Approximate size of a chunk in bytes.
+
+    Returns:
+        int: Number of bytes read from the input.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+    jobs = jobs or os.cpu_count() or 1
+
+    with open(path, "rb") as log_file, \
+            mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+            multiprocessing.Pool(jobs, _init_worker,
+                                 (path, fields, redaction, separator)) as pool:
+        pending = deque()
+        for bounds in chunk_bounds(data, chunk_size):
+            pending.append(pool.apply_async(_redact_chunk, (bounds,)))
+            if len(pending) >= 2 * jobs:
+                output.write(pending.popleft().get())
+        while pending:
+            output.write(pending.popleft().get())
+    output.flush()
+    return size
+
+
+def main() -> None:
+    """
+    Parses the command line and redacts the file, reporting MB/s on stderr.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("input", help="log file to redact")
+    parser.add_argument("output", nargs="?",
+                        help="redacted file, standard output by default")
+    parser.add_argument("-f", "--fields", default=",".join(PII_FIELDS),
+                        help="comma separated PII fields "
+                        "(default: %(default)s)")
+    parser.add_argument("-s", "--separator",
+                        default=RedactingFormatter.SEPARATOR,
+                        help="field separator (default: %(default)s)")
+    parser.add_argument("-r", "--redaction",
+                        default=RedactingFormatter.REDACTION,
+                        help="replacement text (default: %(default)s)")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=8,
+                        help="chunk size in MB (default: %(default)s)")
+    args = parser.parse_args()
+
+    fields = [field for field in args.fields.split(",") if field]
+    start = time.perf_counter()
+    if args.output:
+        with open(args.output, "wb") as output:
+            size = redact_file(args.input, output, fields, args.redaction,
+                               args.separator, args.jobs,
+                               args.chunk_size << 20)
+    else:
+        size = redact_file(args.input, sys.stdout.buffer, fields,
+                           args.redaction, args.separator, args.jobs,
+                           args.chunk_size << 20)
+    elapsed = time.perf_counter() - start
+    print(f"redacted {size / 1e6:.1f} MB in {elapsed:.2f}s "
+          f"({size / 1e6 / elapsed:.1f} MB/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
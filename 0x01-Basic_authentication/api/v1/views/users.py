@@ -2,18 +2,87 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import abort, current_app, jsonify, request
 from models.user import User
+from typing import Iterable, Iterator, List, Union
+import base64
+
+
+def jsonify_users(users: Union[User, List[User]], status: int = 200):
+    """ jsonify a User or a list of Users from their cached JSON
+    Return:
+      - the same response as jsonify, without encoding again the Users
+        that did not change
+    """
+    if current_app.debug or \
+            current_app.config.get("JSONIFY_PRETTYPRINT_REGULAR"):
+        if isinstance(users, list):
+            response = jsonify([user.to_json() for user in users])
+        else:
+            response = jsonify(users.to_json())
+        response.status_code = status
+        return response
+    if isinstance(users, list):
+        data = b"[" + b",".join(user.to_json_bytes() for user in users) + b"]"
+    else:
+        data = users.to_json_bytes()
+    return current_app.response_class(
+        data + b"\n", status=status,
+        mimetype=current_app.config.get("JSONIFY_MIMETYPE",
+                                        "application/json"))
+
+
+def stream_users(users: Iterable[User], chunk: int = 256) -> Iterator[bytes]:
+    """ Generate a JSON array of Users a few Users at a time
+    """
+    yield b"["
+    fragments = []
+    for user in users:
+        fragments.append(user.to_json_bytes())
+        if len(fragments) == chunk:
+            yield b",".join(fragments)
+            # the next chunk starts with a comma
+            fragments = [b""]
+    yield b",".join(fragments) + b"]\n"
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: maximum number of Users, ordered by ID
+      - cursor: where the previous page ended, from its "next" Link
+      - stream: 1 to send all Users as a chunked JSON array
     Return:
       - list of all User objects JSON represented
+      - 400 if limit or cursor is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    if request.args.get("stream") == "1":
+        return current_app.response_class(
+            stream_users(User.all()),
+            mimetype=current_app.config.get("JSONIFY_MIMETYPE",
+                                            "application/json"))
+    limit = request.args.get("limit")
+    cursor = request.args.get("cursor")
+    if limit is None and cursor is None:
+        return jsonify_users(User.all())
+    try:
+        if limit is not None:
+            limit = int(limit)
+            if limit <= 0:
+                raise ValueError("limit must be positive")
+        if cursor is not None:
+            cursor = base64.b64decode(cursor, b"-_", validate=True).decode()
+    except ValueError:
+        return jsonify({'error': "Wrong limit or cursor"}), 400
+
+    users = User.page(cursor, limit)
+    response = jsonify_users(users)
+    if limit is not None and len(users) == limit:
+        next_cursor = base64.urlsafe_b64encode(users[-1].id.encode())
+        response.headers["Link"] = '<{}?limit={}&cursor={}>; rel="next"' \
+            .format(request.base_url, limit, next_cursor.decode())
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -30,7 +99,7 @@ def view_one_user(user_id: str = None) -> str:
     user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    return jsonify_users(user)
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -83,7 +152,7 @@ def create_user() -> str:
             user.first_name = rj.get("first_name")
             user.last_name = rj.get("last_name")
             user.save()
-            return jsonify(user.to_json()), 201
+            return jsonify_users(user, 201)
         except Exception as e:
             error_msg = "Can't create User: {}".format(e)
     return jsonify({'error': error_msg}), 400
@@ -119,4 +188,4 @@ def update_user(user_id: str = None) -> str:
     if rj.get('last_name') is not None:
         user.last_name = rj.get('last_name')
     user.save()
-    return jsonify(user.to_json()), 200
+    return jsonify_users(user)
@@ -0,0 +1,1134 @@
+#!/usr/bin/env python3
+""" File storage module: objects in memory, saved as .db_<Class>.json
+"""
+from models.engine.binary_snapshot import BinarySnapshot, MISSING
+from models.engine.storage import DB_DURABILITY, DURABILITY_MODES, Storage
+from models.engine.storage import matches, order, order_key, ordering
+from models.engine.storage import predicates, prefix_end, sort_key
+from typing import BinaryIO, Callable, TypeVar, List, Iterable
+from os import getenv, path
+from contextlib import contextmanager
+import atexit
+import bisect
+import fcntl
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+
+DB_JOURNAL = getenv("DB_JOURNAL", "0") == "1"
+DB_JOURNAL_MAX_SIZE = int(getenv("DB_JOURNAL_MAX_SIZE", 1 << 20))
+DB_LAZY_LOAD = getenv("DB_LAZY_LOAD", "0") == "1"
+DB_FLUSH_INTERVAL_MS = int(getenv("DB_FLUSH_INTERVAL_MS", 100))
+DB_FLUSH_MAX_PENDING = int(getenv("DB_FLUSH_MAX_PENDING", 1000))
+DB_FORMAT = getenv("DB_FORMAT", "json")
+DB_MAX_CHANGES = int(getenv("DB_MAX_CHANGES", 1024))
+FORMATS = {"json": ".json", "binary": ".bin"}
+
+
+class Index():
+    """ Hash index of the ids of the saved objects of a class on one
+    attribute
+    """
+
+    def __init__(self, attribute: str):
+        """ Initialize an empty index
+        """
+        self.attribute = attribute
+        self.buckets = {}
+        self.values = {}
+        self.shared = False
+        self.owned = set()
+
+    def _bucket(self, value) -> dict:
+        """ Return the bucket of a value to change it, copied first if it
+        is still shared with the index this one is a copy of
+        """
+        bucket = self.buckets.get(value)
+        if bucket is None:
+            bucket = self.buckets[value] = {}
+        elif self.shared and value not in self.owned:
+            bucket = self.buckets[value] = dict(bucket)
+        if self.shared:
+            self.owned.add(value)
+        return bucket
+
+    def add(self, obj_id: str, value):
+        """ Index an object id under an attribute value
+        """
+        value = sort_key(value)
+        if obj_id in self.values and self.values[obj_id] != value:
+            self.discard(obj_id)
+        try:
+            self._bucket(value)[obj_id] = None
+        except TypeError:
+            return
+        self.values[obj_id] = value
+
+    def discard(self, obj_id: str):
+        """ Remove an object id from the index
+        """
+        if obj_id not in self.values:
+            return
+        value = self.values.pop(obj_id)
+        bucket = self._bucket(value)
+        del bucket[obj_id]
+        if len(bucket) == 0:
+            del self.buckets[value]
+
+    def updated(self, values: dict) -> 'Index':
+        """ Return a copy of the index with the values of some object ids
+        changed, MISSING for the ones removed. The copy shares the buckets
+        it does not change with this index, which stays as it is
+        """
+        index = Index(self.attribute)
+        index.buckets = dict(self.buckets)
+        index.values = dict(self.values)
+        index.shared = True
+        for obj_id, value in values.items():
+            if value is MISSING:
+                index.discard(obj_id)
+            else:
+                index.add(obj_id, value)
+        return index
+
+    def lookup(self, value) -> Iterable[str]:
+        """ Return the object ids indexed under a value
+        Raise TypeError if the value can't be indexed
+        """
+        return self.buckets.get(value, {}).keys()
+
+
+class SortedIndex():
+    """ Index of the ids of the saved objects of a class sorted on one
+    attribute, then on id, for range, prefix and ordered queries
+    Objects whose value is None, or can't be compared with the others, are
+    kept apart and come first in order
+    """
+
+    def __init__(self, attribute: str):
+        """ Initialize an empty index
+        Entries are appended until the index is first read, then sorted
+        once, so that building it from all objects does not sort them
+        one by one
+        """
+        self.attribute = attribute
+        self.entries = []
+        self.values = {}
+        self.unordered = {}
+        self.sorted = False
+
+    def _sort(self):
+        """ Sort the entries appended since the last read
+        """
+        if not self.sorted:
+            try:
+                self.entries.sort()
+            except TypeError:
+                types = {}
+                for value, obj_id in self.entries:
+                    types[type(value)] = types.get(type(value), 0) + 1
+                kind = max(types, key=types.get)
+                for value, obj_id in self.entries:
+                    if type(value) is not kind:
+                        del self.values[obj_id]
+                        self.unordered[obj_id] = value
+                self.entries = sorted(entry for entry in self.entries
+                                      if type(entry[0]) is kind)
+            self.sorted = True
+
+    def add(self, obj_id: str, value):
+        """ Index an object id under an attribute value
+        """
+        value = sort_key(value)
+        if obj_id in self.values or obj_id in self.unordered:
+            if self.values.get(obj_id, self.unordered.get(obj_id)) == value:
+                return
+            self.discard(obj_id)
+        if value is None:
+            self.unordered[obj_id] = value
+        elif not self.sorted:
+            self.entries.append((value, obj_id))
+            self.values[obj_id] = value
+        else:
+            try:
+                bisect.insort(self.entries, (value, obj_id))
+                self.values[obj_id] = value
+            except TypeError:
+                self.unordered[obj_id] = value
+
+    def discard(self, obj_id: str):
+        """ Remove an object id from the index
+        """
+        if obj_id in self.unordered:
+            del self.unordered[obj_id]
+            return
+        if obj_id not in self.values:
+            return
+        self._sort()
+        entry = (self.values.pop(obj_id), obj_id)
+        del self.entries[bisect.bisect_left(self.entries, entry)]
+
+    def updated(self, values: dict) -> 'SortedIndex':
+        """ Return a sorted copy of the index with the values of some object
+        ids changed, MISSING for the ones removed, and leave this index as
+        it is. The entries kept are copied by slices between the positions
+        of the entries removed and added, so nothing is sorted again
+        """
+        self._sort()
+        index = SortedIndex(self.attribute)
+        index.values = dict(self.values)
+        index.unordered = dict(self.unordered)
+        edits = []
+        try:
+            for obj_id, value in values.items():
+                index.unordered.pop(obj_id, None)
+                if obj_id in index.values:
+                    entry = (index.values.pop(obj_id), obj_id)
+                    edits.append((bisect.bisect_left(self.entries, entry),
+                                  1, entry))
+                value = None if value is MISSING else sort_key(value)
+                if value is None:
+                    if values[obj_id] is not MISSING:
+                        index.unordered[obj_id] = None
+                    continue
+                entry = (value, obj_id)
+                edits.append((bisect.bisect_left(self.entries, entry), 0,
+                              entry))
+                index.values[obj_id] = value
+            edits.sort()
+        except TypeError:
+            index = SortedIndex(self.attribute)
+            index.entries = [entry for entry in self.entries
+                             if entry[1] not in values]
+            index.values = dict(self.values)
+            index.unordered = dict(self.unordered)
+            for obj_id, value in values.items():
+                index.values.pop(obj_id, None)
+                index.unordered.pop(obj_id, None)
+                if value is not MISSING:
+                    index.add(obj_id, value)
+            index._sort()
+            return index
+
+        start = 0
+        for position, removed, entry in edits:
+            index.entries += self.entries[start:position]
+            if removed:
+                start = position + 1
+            else:
+                index.entries.append(entry)
+                start = position
+        index.entries += self.entries[start:]
+        index.sorted = True
+        return index
+
+    def _bounds(self, value) -> tuple:
+        """ Positions of the first entry with value, and after the last
+        """
+        start = bisect.bisect_left(self.entries, (value,))
+        end = start
+        while end < len(self.entries) and self.entries[end][0] == value:
+            end += 1
+        return start, end
+
+    def lookup(self, operator: str = None, operand=None,
+               descending: bool = False) -> Iterable[str]:
+        """ Iterate in order over the object ids matching a predicate, see
+        storage.matches, or over all of them without operator
+        Raise TypeError if the operand can't be compared with the values
+        """
+        self._sort()
+        entries = self.entries
+        if operator is None:
+            ranges = [(0, len(entries))]
+        elif operator == "in":
+            ranges = sorted(set(self._bounds(value) for value in operand))
+        elif operator == "prefix":
+            if type(operand) is not str:
+                raise TypeError("prefix must be a string")
+            end = prefix_end(operand)
+            ranges = [(bisect.bisect_left(entries, (operand,)),
+                       len(entries) if end is None
+                       else bisect.bisect_left(entries, (end,)))]
+        else:
+            start, end = self._bounds(operand)
+            ranges = [{"eq": (start, end), "lt": (0, start),
+                       "lte": (0, end), "gt": (end, len(entries)),
+                       "gte": (start, len(entries))}[operator]]
+
+        apart = [obj_id for obj_id, value in sorted(self.unordered.items())
+                 if operator is None or matches(value, operator, operand)]
+        if descending:
+            ids = (entries[i][1] for start, end in reversed(ranges)
+                   for i in range(end - 1, start - 1, -1))
+            return itertools.chain(ids, reversed(apart))
+        ids = (entries[i][1] for start, end in ranges
+               for i in range(start, end))
+        return itertools.chain(apart, ids)
+
+
+class JSONSnapshot():
+    """ Snapshot file of JSON records, kept open to read them back
+    """
+
+    def __init__(self, snapshot: BinaryIO):
+        """ Initialize from the open file
+        """
+        self.file = snapshot
+
+    def read(self, start: int, end: int) -> dict:
+        """ Decode the record between start and end
+        """
+        return json.loads(os.pread(self.file.fileno(), end - start, start))
+
+
+class Objects(dict):
+    """ Objects of a class by id
+    Until an object is first read, its value can also be its raw JSON
+    record, or the (start, end, indexed values) of its record in the
+    snapshot, a JSONSnapshot or BinarySnapshot it is then read back from
+    """
+
+    def __init__(self, cls: type, snapshot=None):
+        """ Initialize an empty collection of cls instances
+        """
+        super().__init__()
+        self.cls = cls
+        self.indexed = tuple(dict.fromkeys(cls.indexed_attributes +
+                                           cls.sorted_attributes))
+        self.snapshot = snapshot
+        self.built = True
+
+    def __getitem__(self, obj_id: str) -> TypeVar('Base'):
+        """ Return an object, building it from its record if needed
+        """
+        obj = super().__getitem__(obj_id)
+        if type(obj) in (dict, tuple):
+            obj = self.cls(**self.record(obj_id))
+            super().__setitem__(obj_id, obj)
+        return obj
+
+    def get(self, obj_id: str, default=None) -> TypeVar('Base'):
+        """ Return an object, or default if there is none with this id
+        """
+        if obj_id not in self:
+            return default
+        return self[obj_id]
+
+    def values(self) -> Iterable[TypeVar('Base')]:
+        """ Return all objects, building the ones not read yet
+        """
+        if not self.built:
+            for obj_id in list(self.keys()):
+                self[obj_id]
+            self.built = True
+        return super().values()
+
+    def items(self) -> Iterable[tuple]:
+        """ Return all (id, object) pairs, building the objects not read yet
+        """
+        self.values()
+        return super().items()
+
+    def copy(self) -> 'Objects':
+        """ Return a shallow copy, with the objects not read yet still kept
+        as records
+        """
+        objs = Objects(self.cls, self.snapshot)
+        dict.update(objs, self)
+        objs.built = self.built
+        return objs
+
+    def add_record(self, obj_id: str, obj_json):
+        """ Add an object by its JSON record, or the position of the record
+        in the snapshot file
+        """
+        self.built = False
+        super().__setitem__(obj_id, obj_json)
+
+    def record(self, obj_id: str) -> dict:
+        """ Return the JSON record of an object without building it
+        """
+        obj = super().__getitem__(obj_id)
+        if type(obj) is dict:
+            return obj
+        if type(obj) is tuple:
+            return self.snapshot.read(obj[0], obj[1])
+        return obj.to_json(True)
+
+    def row(self, obj_id: str, fields: tuple):
+        """ Return the values of fields of an object, then a dictionary of
+        its other attributes, for a BinarySnapshot with these fields, or
+        the bytes of its record if it is still in such a snapshot
+        """
+        obj = super().__getitem__(obj_id)
+        if type(obj) is tuple:
+            if type(self.snapshot) is BinarySnapshot and \
+                    self.snapshot.fields[:-1] == fields:
+                return self.snapshot.raw(obj[0], obj[1])
+            obj = self.snapshot.read(obj[0], obj[1])
+        if type(obj) is dict:
+            return tuple(obj.get(field, MISSING) for field in fields) + \
+                ({k: v for k, v in obj.items() if k not in fields},)
+        return tuple(getattr(obj, field, MISSING) for field in fields) + \
+            (getattr(obj, "__dict__", None),)
+
+    def peek(self, obj_id: str, attribute: str):
+        """ Return an attribute of an object without building it
+        """
+        if attribute == "id":
+            return obj_id
+        obj = super().__getitem__(obj_id)
+        if type(obj) is tuple and attribute in self.indexed:
+            return obj[2][self.indexed.index(attribute)]
+        if type(obj) in (dict, tuple):
+            return self.record(obj_id).get(attribute)
+        return getattr(obj, attribute, None)
+
+
+class Layer():
+    """ Objects of a class by id with their indexes, never changed once
+    published. The top layer of a Version keeps None for the ids of the
+    objects removed since its base
+    """
+
+    def __init__(self, objects: Objects, indexes: dict,
+                 sorted_indexes: dict):
+        """ Initialize a layer of objects indexed by indexes and
+        sorted_indexes, by attribute
+        """
+        self.objects = objects
+        self.indexes = indexes
+        self.sorted_indexes = sorted_indexes
+
+    def empty(self) -> 'Layer':
+        """ Return an empty layer with the same indexes
+        """
+        sorted_indexes = {attribute: SortedIndex(attribute)
+                          for attribute in self.sorted_indexes}
+        for index in sorted_indexes.values():
+            index._sort()
+        return Layer(Objects(self.objects.cls),
+                     {attribute: Index(attribute)
+                      for attribute in self.indexes}, sorted_indexes)
+
+    def updated(self, changes: dict, removed: bool = False) -> 'Layer':
+        """ Return a copy of the layer with the objects of changes saved,
+        or removed if None, in which case they are kept as None if removed
+        is set
+        """
+        objects = self.objects.copy()
+        for obj_id, obj in changes.items():
+            if obj is None and not removed:
+                objects.pop(obj_id, None)
+            else:
+                dict.__setitem__(objects, obj_id, obj)
+
+        def _values(attribute: str) -> dict:
+            return {obj_id: MISSING if obj is None
+                    else getattr(obj, attribute, None)
+                    for obj_id, obj in changes.items()}
+
+        return Layer(objects,
+                     {attribute: index.updated(_values(attribute))
+                      for attribute, index in self.indexes.items()},
+                     {attribute: index.updated(_values(attribute))
+                      for attribute, index in self.sorted_indexes.items()})
+
+    def candidates(self, query: list, attribute: str,
+                   descending: bool) -> tuple:
+        """ Return the ids of the objects that can match the predicates of
+        query, None for all of them, and whether they are in order of
+        attribute
+        The candidates come from the hash index of the first equality or
+        in predicate on an indexed attribute, else from the sorted index
+        of the first predicate on a sorted attribute, else from the sorted
+        index of attribute
+        """
+        indexes = self.indexes
+        sorted_indexes = self.sorted_indexes
+        for k, operator, v in query:
+            if k in indexes and operator in ("eq", "in"):
+                try:
+                    return list(dict.fromkeys(itertools.chain(
+                        *(indexes[k].lookup(value) for value in
+                          (v if operator == "in" else (v,)))))), False
+                except TypeError:
+                    continue
+        for k, operator, v in query:
+            if k in sorted_indexes:
+                try:
+                    return sorted_indexes[k].lookup(
+                        operator, v, descending and k == attribute), \
+                        k == attribute
+                except TypeError:
+                    continue
+        if attribute in sorted_indexes:
+            return sorted_indexes[attribute].lookup(
+                descending=descending), True
+        return None, False
+
+
+class Version():
+    """ State of the objects of a class at one point in time, read without
+    locks and never changed once published
+    - base: the Layer of the objects as of the last merge
+    - top: the Layer of the objects saved or removed since
+    A mutation publishes a new version with a copy of the top layer, which
+    stays small: it is merged into a copy of the base once it is large
+    enough
+    """
+
+    def __init__(self, base: Layer, top: Layer = None, size: int = None):
+        """ Initialize a version of size objects
+        """
+        self.base = base
+        self.top = base.empty() if top is None else top
+        self.size = len(base.objects.keys()) if size is None else size
+
+    def __len__(self) -> int:
+        """ Number of objects
+        """
+        return self.size
+
+    def __contains__(self, obj_id: str) -> bool:
+        """ Whether there is an object with this id
+        """
+        if obj_id in self.top.objects:
+            return self.top.objects[obj_id] is not None
+        return obj_id in self.base.objects
+
+    def get(self, obj_id: str) -> TypeVar('Base'):
+        """ Return an object, or None if there is none with this id
+        """
+        if obj_id in self.top.objects:
+            return self.top.objects[obj_id]
+        return self.base.objects.get(obj_id)
+
+    def changed(self, obj_id: str, obj: TypeVar('Base')) -> 'Version':
+        """ Return the version with an object saved, or removed if obj is
+        None
+        """
+        size = self.size + (obj is not None) - (obj_id in self)
+        return Version(self.base, self.top.updated({obj_id: obj}, True),
+                       size)
+
+    def merged(self) -> 'Version':
+        """ Return the version with its top layer merged into its base
+        """
+        if len(self.top.objects) == 0:
+            return self
+        return Version(self.base.updated(self.top.objects), size=self.size)
+
+
+class Flusher():
+    """ Writes the mutations of the store to disk
+    - sync: every mutation is written before save() or remove() returns
+    - batched: a background thread writes the dirty classes every
+      interval_ms, or as soon as max_pending mutations are waiting
+    - fsync: batched, and every write is synced to disk
+    """
+
+    def __init__(self, write: Callable, mode: str = "sync",
+                 interval_ms: int = 100, max_pending: int = 1000):
+        """ Initialize a flusher of mutations given to write(cls, records,
+        fsync), its thread starts with the first mutation
+        """
+        if mode not in DURABILITY_MODES:
+            raise ValueError("durability must be one of {}"
+                             .format(", ".join(DURABILITY_MODES)))
+        self.write = write
+        self.mode = mode
+        self.interval = interval_ms / 1000
+        self.max_pending = max_pending
+        self._dirty = {}
+        self._writing = {}
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._flushes = 0
+        self._flush_total = 0.0
+        self._flush_max = 0.0
+
+    def mark(self, cls: type, record: dict):
+        """ Record a mutation of a class
+        """
+        if self.mode == "sync":
+            with self._flush_lock:
+                start = time.perf_counter()
+                self.write(cls, [record])
+                self._record(time.perf_counter() - start)
+            return
+        with self._condition:
+            self._dirty.setdefault(cls, []).append(record)
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                daemon=True)
+                self._thread.start()
+            if self._pending >= self.max_pending:
+                self._condition.notify()
+
+    def flush(self):
+        """ Write every pending mutation now
+        """
+        with self._flush_lock:
+            with self._condition:
+                dirty, self._dirty = self._dirty, {}
+                self._writing = dirty
+                self._pending = 0
+            if len(dirty) == 0:
+                return
+            start = time.perf_counter()
+            try:
+                for cls, records in dirty.items():
+                    self.write(cls, records, self.mode == "fsync")
+            finally:
+                with self._condition:
+                    self._writing = {}
+            self._record(time.perf_counter() - start)
+
+    def pending(self, cls: type) -> List[dict]:
+        """ Mutations of a class not written yet, oldest first, including
+        the ones being written
+        """
+        with self._condition:
+            return self._writing.get(cls, []) + self._dirty.get(cls, [])
+
+    def _record(self, latency: float):
+        """ Account for one flush, called with the flush lock held
+        """
+        self._flushes += 1
+        self._flush_total += latency
+        self._flush_max = max(self._flush_max, latency)
+
+    def metrics(self) -> dict:
+        """ Pending mutations and flush latencies in milliseconds
+        """
+        with self._condition:
+            pending = self._pending
+        return {
+            "mode": self.mode,
+            "pending": pending,
+            "flushes": self._flushes,
+            "flush_avg": (self._flush_total / self._flushes * 1000
+                          if self._flushes else 0.0),
+            "flush_max": self._flush_max * 1000,
+        }
+
+    def _run(self):
+        """ Flush in the background until the process exits
+        """
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._pending >= self.max_pending,
+                    self.interval)
+            self.flush()
+
+
+class FileStorage(Storage):
+    """ Storage keeping all objects in memory, by class in data, saved
+    to .db_<Class>.json
+    - journal: save() and remove() append one record to
+      .db_<Class>.journal instead of rewriting .db_<Class>.json, which is
+      rewritten once the journal is larger than journal_max_size
+    - lazy: load() only keeps the position of each record in the file,
+      and an object is built when it is first read
+    - durability: when writes happen, see Flusher
+    - snapshot_format: "json", or "binary" for a BinarySnapshot in
+      .db_<Class>.bin. The snapshot of the other format is read when there
+      is none in this one, so the next save converts it. The journal is
+      always JSON
+    - max_changes: the number of objects saved or removed since the last
+      merge of a Version above which its top layer is merged
+    Several processes can share the files: writes hold an exclusive lock
+    on .db_<Class>.lock, and reads first compare the inode, size and
+    modification time of the journal, or of the snapshot without journal,
+    with the ones of the last read to load what other processes wrote.
+    When only records were appended to the journal, only these are read
+    Several threads can share the storage: the objects of each class are
+    the Version in versions, which writers replace holding the lock of the
+    class in locks, and readers use without lock
+    """
+
+    def __init__(self, journal: bool = DB_JOURNAL,
+                 journal_max_size: int = DB_JOURNAL_MAX_SIZE,
+                 lazy: bool = DB_LAZY_LOAD, durability: str = DB_DURABILITY,
+                 flush_interval_ms: int = DB_FLUSH_INTERVAL_MS,
+                 flush_max_pending: int = DB_FLUSH_MAX_PENDING,
+                 snapshot_format: str = DB_FORMAT,
+                 max_changes: int = DB_MAX_CHANGES):
+        """ Initialize an empty storage
+        """
+        if snapshot_format not in FORMATS:
+            raise ValueError("snapshot_format must be one of {}"
+                             .format(", ".join(FORMATS)))
+        self.snapshot_format = snapshot_format
+        self.max_changes = max_changes
+        self.versions = {}
+        self.locks = {}
+        self.stamps = {}
+        self.snapshots = {}
+        self.offsets = {}
+        self.journal = journal
+        self.journal_max_size = journal_max_size
+        self.lazy = lazy
+        self.flusher = Flusher(self.write, durability, flush_interval_ms,
+                               flush_max_pending)
+        atexit.register(self.flusher.flush)
+
+    def _lock(self, cls: type) -> threading.RLock:
+        """ Lock the threads writing the objects of a class hold
+        """
+        lock = self.locks.get(cls.__name__)
+        if lock is None:
+            lock = self.locks.setdefault(cls.__name__, threading.RLock())
+        return lock
+
+    def _version(self, cls: type) -> Version:
+        """ Current version of the objects of a class
+        """
+        version = self.versions.get(cls.__name__)
+        if version is None:
+            version = self.versions.setdefault(
+                cls.__name__, self._indexed(cls, Objects(cls)))
+        return version
+
+    def _change(self, cls: type, obj_id: str, obj: TypeVar('Base')):
+        """ Publish the version with an object saved, or removed if obj is
+        None, with the lock of the class held
+        """
+        version = self._version(cls).changed(obj_id, obj)
+        if len(version.top.objects) > self.max_changes:
+            version = version.merged()
+        self.versions[cls.__name__] = version
+
+    def objects(self, cls: type) -> Objects:
+        """ All objects of a class by id, which must not be changed
+        """
+        with self._lock(cls):
+            version = self._version(cls).merged()
+            self.versions[cls.__name__] = version
+            return version.base.objects
+
+    def _file_path(self, cls: type, snapshot_format: str = None) -> str:
+        """ Path of the snapshot of a class, in snapshot_format by default
+        """
+        return ".db_{}{}".format(
+            cls.__name__, FORMATS[snapshot_format or self.snapshot_format])
+
+    @staticmethod
+    def _journal_path(cls: type) -> str:
+        """ Path of the journal of a class
+        """
+        return ".db_{}.journal".format(cls.__name__)
+
+    @staticmethod
+    def _sync_directory(file_path: str):
+        """ Sync to disk the directory of a file, so that a rename in it
+        survives a crash
+        """
+        fd = os.open(path.dirname(file_path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _stamp(self, cls: type, snapshot: bool = False) -> tuple:
+        """ Inode, size and modification time of the file every write of a
+        class changes, or of the snapshot, None if it does not exist
+        """
+        if self.journal and not snapshot:
+            stamp_path = self._journal_path(cls)
+        else:
+            stamp_path = self._file_path(cls)
+        try:
+            stat = os.stat(stamp_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    @contextmanager
+    def _locked(self, cls: type, operation: int):
+        """ Hold a shared or exclusive lock on the files of a class
+        The lock file is opened each time, so threads exclude each other too.
+        It is opened read-only, and a shared lock is skipped when it cannot
+        be created: nobody can write the files of a read-only directory
+        """
+        try:
+            fd = os.open(".db_{}.lock".format(cls.__name__),
+                         os.O_RDONLY | os.O_CREAT, 0o644)
+        except OSError:
+            if operation != fcntl.LOCK_SH:
+                raise
+            fd = None
+        try:
+            if fd is not None:
+                fcntl.flock(fd, operation)
+            yield
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def load(self, cls: type):
+        """ Load all objects of a class, reading only what changed since
+        the last load. A class already loaded is only refreshed
+        Pending mutations are written first, so that none is lost
+        """
+        if cls.__name__ in self.stamps:
+            self.refresh(cls)
+            return
+        self.flusher.flush()
+        with self._lock(cls), self._locked(cls, fcntl.LOCK_SH):
+            self._sync(cls)
+
+    def refresh(self, cls: type):
+        """ Load what other processes wrote since the last read of a loaded
+        class. Costs one stat when nothing changed
+        """
+        s_class = cls.__name__
+        if s_class not in self.stamps or \
+                self._stamp(cls) == self.stamps[s_class]:
+            return
+        self.flusher.flush()
+        with self._lock(cls), self._locked(cls, fcntl.LOCK_SH):
+            self._sync(cls)
+
+    def _sync(self, cls: type, repair: bool = False):
+        """ Bring the objects of a class up to date with the files, with the
+        locks held. If the journal only grew since the last read, and the
+        snapshot is the same, only the new records of the journal are read.
+        Otherwise everything is read again, and the mutations the flusher
+        has not written yet are applied on top, so that none is lost
+        """
+        s_class = cls.__name__
+        stamp = self._stamp(cls)
+        last = self.stamps.get(s_class, False)
+        if stamp == last:
+            return
+        grown = stamp is not None and stamp[1] >= self.offsets.get(s_class, 0)
+        if self.journal and last is not False and grown and \
+                (last is None or stamp[0] == last[0]) and \
+                self._stamp(cls, True) == self.snapshots[s_class]:
+            records, self.offsets[s_class] = self._read_journal(
+                cls, self.offsets[s_class], repair)
+            self._apply(cls, records)
+        else:
+            self._load(cls, repair)
+            self._apply(cls, self.flusher.pending(cls))
+        self.stamps[s_class] = self._stamp(cls)
+        self.snapshots[s_class] = self._stamp(cls, True)
+
+    def _load(self, cls: type, repair: bool = False):
+        """ Load all objects from file, then replay the journal, and publish
+        them as a new version
+        The snapshot is read in snapshot_format, else in the other format
+        """
+        objs = Objects(cls)
+        file_path = self._file_path(cls)
+        if not path.exists(file_path):
+            other = "json" if self.snapshot_format == "binary" else "binary"
+            file_path = self._file_path(cls, other)
+        if not path.exists(file_path):
+            pass
+        elif file_path.endswith(FORMATS["binary"]):
+            objs = self._load_binary(cls, file_path)
+        elif self.lazy:
+            objs = self._index_file(cls, file_path)
+        else:
+            with open(file_path, 'r') as f:
+                objs_json = json.load(f)
+                for obj_id, obj_json in objs_json.items():
+                    objs[obj_id] = cls(**obj_json)
+        records, self.offsets[cls.__name__] = self._read_journal(cls, 0,
+                                                                 repair)
+        for record in records:
+            if record["op"] == "remove":
+                objs.pop(record["id"], None)
+            elif self.lazy:
+                objs.add_record(record["id"], record["obj"])
+            else:
+                objs[record["id"]] = cls(**record["obj"])
+        self._build_indexes(cls, objs)
+
+    def _index_file(self, cls: type, file_path: str) -> Objects:
+        """ Load the position and indexed attributes of every record of a
+        snapshot, keeping the file open to read the records later
+        """
+        snapshot = open(file_path, 'rb')
+        text = snapshot.read().decode()
+        if not text.isascii():
+            snapshot.close()
+            objs = Objects(cls)
+            for obj_id, obj_json in json.loads(text).items():
+                objs.add_record(obj_id, obj_json)
+            return objs
+
+        objs = Objects(cls, JSONSnapshot(snapshot))
+        decoder = json.JSONDecoder()
+        skip = json.decoder.WHITESPACE.match
+        i = skip(text, skip(text, 0).end() + 1).end()
+        while text[i] != "}":
+            obj_id, i = decoder.raw_decode(text, i)
+            start = skip(text, skip(text, i).end() + 1).end()
+            obj_json, end = decoder.raw_decode(text, start)
+            objs.add_record(obj_id, (start, end, tuple(
+                obj_json.get(attribute) for attribute in objs.indexed)))
+            i = skip(text, end).end()
+            if text[i] == ",":
+                i = skip(text, i + 1).end()
+        return objs
+
+    def _load_binary(self, cls: type, file_path: str) -> Objects:
+        """ Load a binary snapshot, or only the position and indexed
+        attributes of its records if lazy
+        """
+        snapshot = BinarySnapshot.open(file_path)
+        objs = Objects(cls, snapshot)
+        if self.lazy:
+            for position in snapshot.positions(("id",) + objs.indexed):
+                objs.add_record(position[2],
+                                (position[0], position[1], position[3:]))
+            return objs
+        for start, end in snapshot.positions():
+            obj_json = snapshot.read(start, end)
+            objs[obj_json["id"]] = cls(**obj_json)
+        return objs
+
+    def _read_journal(self, cls: type, offset: int,
+                      repair: bool = False) -> tuple:
+        """ Return the records of the journal from offset, and the offset
+        of its end
+        A record torn by a crash while it was appended is skipped, and cut
+        off if repair is set, which needs the exclusive lock
+        """
+        journal_path = self._journal_path(cls)
+        if not path.exists(journal_path):
+            return [], 0
+
+        records = []
+        with open(journal_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                offset += len(line)
+        if repair and offset < path.getsize(journal_path):
+            os.truncate(journal_path, offset)
+        return records, offset
+
+    def _apply(self, cls: type, records: List[dict]):
+        """ Apply journal records to the current version, with the lock of
+        the class held
+        """
+        for record in records:
+            self._change(cls, record["id"], None if record["op"] == "remove"
+                         else cls(**record["obj"]))
+
+    def _append_journal(self, cls: type, records: List[dict],
+                        fsync: bool = False):
+        """ Append records to the journal, and compact the journal into
+        a new snapshot once it is larger than journal_max_size
+        """
+        with open(self._journal_path(cls), 'a') as f:
+            f.write("".join(json.dumps(record) + "\n"
+                            for record in records))
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+            size = f.tell()
+        self.offsets[cls.__name__] = size
+        self.stamps[cls.__name__] = self._stamp(cls)
+        if size > self.journal_max_size:
+            self._dump(cls)
+
+    def write(self, cls: type, records: List[dict], fsync: bool = False):
+        """ Persist mutations, to the journal or as a new snapshot
+        What other processes wrote is loaded first, and the mutations
+        applied again on top of it
+        """
+        with self._lock(cls), self._locked(cls, fcntl.LOCK_EX):
+            s_class = cls.__name__
+            if s_class in self.stamps and \
+                    self._stamp(cls) != self.stamps[s_class]:
+                self._sync(cls, True)
+                self._apply(cls, records)
+            if self.journal:
+                self._append_journal(cls, records, fsync)
+            else:
+                self._dump(cls, fsync)
+
+    @staticmethod
+    def _indexed(cls: type, objs: Objects) -> Version:
+        """ Return a version of objects of a class with new indexes
+        Every class has a sorted index on id, for page
+        """
+        indexes = {attribute: Index(attribute)
+                   for attribute in cls.indexed_attributes}
+        sorted_indexes = {attribute: SortedIndex(attribute)
+                          for attribute in ("id",) +
+                          tuple(cls.sorted_attributes)}
+        every_index = list(indexes.values()) + list(sorted_indexes.values())
+        for obj_id in objs.keys():
+            for index in every_index:
+                index.add(obj_id, objs.peek(obj_id, index.attribute))
+        for index in sorted_indexes.values():
+            index._sort()
+        return Version(Layer(objs, indexes, sorted_indexes))
+
+    def _build_indexes(self, cls: type, objs: Objects = None):
+        """ Publish objs, or all objects of a class, with new indexes
+        """
+        with self._lock(cls):
+            if objs is None:
+                objs = self.objects(cls)
+            self.versions[cls.__name__] = self._indexed(cls, objs)
+
+    def dump(self, cls: type, fsync: bool = False):
+        """ Save all objects to file, with what other processes wrote
+        """
+        self.flusher.flush()
+        with self._lock(cls), self._locked(cls, fcntl.LOCK_EX):
+            if cls.__name__ in self.stamps:
+                self._sync(cls, True)
+            self._dump(cls, fsync)
+
+    def _dump(self, cls: type, fsync: bool = False):
+        """ Save all objects to file and start a new journal, with the
+        exclusive lock held
+        The snapshot is written to a temporary file renamed over the old
+        one, and both the file and the rename are synced to disk before
+        the journal is discarded, so a crash leaves either snapshot
+        intact with its journal
+        """
+        file_path = self._file_path(cls)
+        journal_path = self._journal_path(cls)
+        compacting = path.exists(journal_path) and \
+            path.getsize(journal_path) > 0
+        objs = self.objects(cls)
+        ids = list(objs.keys())
+
+        tmp_path = "{}.tmp".format(file_path)
+        binary = self.snapshot_format == "binary"
+        with open(tmp_path, 'wb' if binary else 'w') as f:
+            if binary:
+                fields = tuple(objs.record(ids[0])) if ids else ("id",)
+                BinarySnapshot.write(f, fields, (objs.row(obj_id, fields)
+                                                 for obj_id in ids))
+            else:
+                json.dump({obj_id: objs.record(obj_id) for obj_id in ids}, f)
+            if compacting or fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+        if compacting or fsync:
+            self._sync_directory(file_path)
+        if compacting:
+            tmp_path = "{}.tmp".format(journal_path)
+            open(tmp_path, 'w').close()
+            os.replace(tmp_path, journal_path)
+        self.offsets[cls.__name__] = 0
+        self.stamps[cls.__name__] = self._stamp(cls)
+        self.snapshots[cls.__name__] = self._stamp(cls, True)
+
+    def save(self, obj: TypeVar('Base')):
+        """ Save an object
+        """
+        cls = obj.__class__
+        with self._lock(cls):
+            self._change(cls, obj.id, obj)
+            self.flusher.mark(cls, {"op": "save", "id": obj.id,
+                                    "obj": obj.to_json(True)})
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Remove an object
+        """
+        cls = obj.__class__
+        with self._lock(cls):
+            if obj.id in self._version(cls):
+                self._change(cls, obj.id, None)
+                self.flusher.mark(cls, {"op": "remove", "id": obj.id})
+
+    def count(self, cls: type) -> int:
+        """ Count all objects of a class
+        """
+        self.refresh(cls)
+        return len(self._version(cls))
+
+    def get(self, cls: type, obj_id: str) -> TypeVar('Base'):
+        """ Return one object of a class by ID
+        """
+        self.refresh(cls)
+        return self._version(cls).get(obj_id)
+
+    def page(self, cls: type, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects ordered by id, starting after the
+        id after
+        The sorted index on id is searched from the position of after, so
+        a page costs O(log N + limit) whatever the number of objects
+        """
+        return self.search(cls, {} if after is None else {"id__gt": after},
+                           "id", limit)
+
+    def search(self, cls: type, attributes: dict = {},
+               order_by: str = None,
+               limit: int = None) -> List[TypeVar('Base')]:
+        """ Search the objects matching all predicates of attributes,
+        ordered by order_by, up to limit
+        Both layers of the version give their candidates, see
+        Layer.candidates, which are merged in order when they both come
+        in order, and a heap keeps the first objects otherwise. An object
+        of the top layer replaces the one of the base with its id
+        """
+        self.refresh(cls)
+        version = self._version(cls)
+        base, top = version.base, version.top
+        changes = top.objects
+        query = predicates(attributes)
+        attribute, descending = ordering(order_by or "")
+
+        def _matches(obj) -> bool:
+            return obj is not None and all(
+                matches(getattr(obj, k), operator, v)
+                for k, operator, v in query)
+
+        candidates, ordered = base.candidates(query, attribute, descending)
+        if candidates is None and len(changes) == 0:
+            found = iter(base.objects.values())
+        elif candidates is None:
+            found = (changes.get(obj_id, obj)
+                     for obj_id, obj in base.objects.items())
+        else:
+            found = (base.objects[obj_id] for obj_id in candidates
+                     if obj_id not in changes)
+        found = filter(_matches, found)
+        if len(changes) > 0:
+            ids, top_ordered = top.candidates(query, attribute, descending)
+            if ids is None:
+                ids = changes.keys()
+            if candidates is None:
+                ids = (obj_id for obj_id in ids
+                       if obj_id not in base.objects)
+            changed = filter(_matches, (changes[obj_id] for obj_id in ids))
+            ordered = ordered and top_ordered
+            if order_by is None:
+                found = itertools.chain(found, changed)
+            elif ordered:
+                found = heapq.merge(found, changed, key=order_key(attribute),
+                                    reverse=descending)
+            else:
+                found = itertools.chain(found, changed)
+        if not ordered and order_by is not None:
+            return order(found, order_by, limit)
+        return list(itertools.islice(found, limit))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+""" Storage module
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from os import getenv
+from typing import Callable, TypeVar, List, Iterable
+import heapq
+
+
+DB_DURABILITY = getenv("DB_DURABILITY", "sync")
+DURABILITY_MODES = ("sync", "batched", "fsync")
+OPERATORS = ("eq", "lt", "lte", "gt", "gte", "prefix", "in")
+
+
+def sort_key(value):
+    """ Value compared by queries and indexes: timestamps are compared as
+    the ISO strings they are saved as
+    """
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def predicates(attributes: dict) -> List[tuple]:
+    """ (attribute, operator, operand) of every key of a search query
+    A key is an attribute, for equality, or an attribute and one of
+    OPERATORS separated by two underscores, like "created_at__lt"
+    """
+    result = []
+    for key, operand in attributes.items():
+        attribute, _, operator = key.rpartition("__")
+        if attribute == "" or operator not in OPERATORS:
+            attribute, operator = key, "eq"
+        if operator == "in":
+            operand = tuple(sort_key(value) for value in operand)
+        else:
+            operand = sort_key(operand)
+        result.append((attribute, operator, operand))
+    return result
+
+
+def matches(value, operator: str, operand) -> bool:
+    """ Whether an attribute value satisfies a predicate
+    Values that can't be compared to the operand don't
+    """
+    value = sort_key(value)
+    try:
+        if operator == "eq":
+            return value == operand
+        if operator == "in":
+            return value in operand
+        if value is None:
+            return False
+        if operator == "lt":
+            return value < operand
+        if operator == "lte":
+            return value <= operand
+        if operator == "gt":
+            return value > operand
+        if operator == "gte":
+            return value >= operand
+        return type(value) is str and value.startswith(operand)
+    except TypeError:
+        return False
+
+
+def prefix_end(prefix: str) -> str:
+    """ Smallest string greater than all the strings starting with prefix,
+    None if there is none
+    """
+    while prefix and ord(prefix[-1]) == 0x10ffff:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def ordering(order_by: str) -> tuple:
+    """ (attribute, descending) of an order_by argument: an attribute,
+    prefixed with "-" for descending order
+    """
+    if order_by.startswith("-"):
+        return order_by[1:], True
+    return order_by, False
+
+
+def order_key(attribute: str) -> Callable:
+    """ Key of the objects sorted on an attribute, then on id, None first
+    """
+    def _key(obj):
+        value = sort_key(getattr(obj, attribute))
+        return (value is not None, value, obj.id)
+    return _key
+
+
+def order(objs: Iterable[TypeVar('Base')], order_by: str,
+          limit: int = None) -> List[TypeVar('Base')]:
+    """ Sort objects on an attribute, then on id. None comes first in
+    ascending order. With a limit, only the first objects are kept in a
+    heap instead of sorting all of them
+    """
+    attribute, descending = ordering(order_by)
+    _key = order_key(attribute)
+    if limit is None:
+        return sorted(objs, key=_key, reverse=descending)
+    if descending:
+        return heapq.nlargest(limit, objs, key=_key)
+    return heapq.nsmallest(limit, objs, key=_key)
+
+
+class Storage(ABC):
+    """ Interface of the storages of Base objects
+    Every method takes the class of the objects, so one storage holds the
+    objects of all classes. A storage missing one of them can't be
+    instantiated
+    """
+
+    @abstractmethod
+    def load(self, cls: type):
+        """ Load all objects of a class
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def dump(self, cls: type):
+        """ Write all objects of a class
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def save(self, obj: TypeVar('Base')):
+        """ Save an object
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def remove(self, obj: TypeVar('Base')):
+        """ Remove an object
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def count(self, cls: type) -> int:
+        """ Count all objects of a class
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def get(self, cls: type, obj_id: str) -> TypeVar('Base'):
+        """ Return one object of a class by ID, or None
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def search(self, cls: type, attributes: dict = {},
+               order_by: str = None,
+               limit: int = None) -> List[TypeVar('Base')]:
+        """ Return the objects of a class matching all predicates of
+        attributes, see predicates(), ordered by order_by, see order(),
+        up to limit
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def page(self, cls: type, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects of a class ordered by id, starting
+        after the id after
+        """
+        raise NotImplementedError()
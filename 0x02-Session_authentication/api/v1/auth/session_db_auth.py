@@ -12,6 +12,11 @@ from models.user_session import UserSession
 class SessionDBAuth(SessionExpAuth):
     """A class used to handle session authentication with a database."""
 
+    def __init__(self):
+        """Initializes the SessionDBAuth and loads the stored sessions."""
+        super().__init__()
+        UserSession.load_from_file()
+
     def create_session(self, user_id=None):
         """Creates a new session for a user and saves it in the database."""
         session_id = super().create_session(user_id)
@@ -22,7 +27,6 @@ class SessionDBAuth(SessionExpAuth):
     def user_id_for_session_id(self, session_id=None):
         """Retrieves the user ID associated with a session ID."""
         if session_id:
-            UserSession.load_from_file()
             user_sessions = UserSession.search({"session_id": session_id})
             if user_sessions:
                 user_session = user_sessions[0]
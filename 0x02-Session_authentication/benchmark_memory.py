@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+""" Memory used per User and UserSession, compared with the former
+representation keeping every attribute and datetime in a __dict__
+Usage: ./benchmark_memory.py [count]
+"""
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from models.user import User
+from models.user_session import UserSession
+
+
+class DictUser():
+    """ User as it was stored before __slots__
+    """
+
+    def __init__(self, **kwargs: dict):
+        """ Initialize a DictUser instance
+        """
+        self.id = str(uuid.uuid4())
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+
+
+class DictUserSession():
+    """ UserSession as it was stored before __slots__
+    """
+
+    def __init__(self, **kwargs: dict):
+        """ Initialize a DictUserSession instance
+        """
+        self.id = str(uuid.uuid4())
+        self.created_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+        self.user_id = kwargs.get('user_id')
+        self.session_id = kwargs.get('session_id')
+
+
+def bytes_per_object(cls: type, count: int) -> float:
+    """ Average memory allocated by creating count instances of cls
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    if cls in (User, DictUser):
+        objs = [cls(email="user{}@hbtn.io".format(i),
+                    _password="{:064x}".format(i),
+                    first_name="First{}".format(i),
+                    last_name="Last{}".format(i)) for i in range(count)]
+    else:
+        objs = [cls(user_id=str(uuid.uuid4()), session_id=str(uuid.uuid4()))
+                for i in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objs
+    return used / count
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print("{:>12} {:>14} {:>14}".format("model", "before (B)", "after (B)"))
+    for name, before, after in (("User", DictUser, User),
+                                ("UserSession", DictUserSession,
+                                 UserSession)):
+        print("{:>12} {:>14.0f} {:>14.0f}".format(
+            name, bytes_per_object(before, count),
+            bytes_per_object(after, count)))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+""" Benchmark of range, prefix and ordered User.search queries, with
+and without the sorted indexes, in which case the query goes through all
+users and sorts the matching ones
+Usage: ./benchmark_queries.py [max_users]
+"""
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from models.base import STORAGE
+from models.engine.file_storage import Objects
+from models.user import User
+
+
+QUERIES = {
+    "last 100 created": lambda cutoff: User.search(
+        {"created_at__gte": cutoff}),
+    "email prefix": lambda cutoff: User.search(
+        {"email__prefix": "user42"}, "email"),
+    "50 most recent": lambda cutoff: User.search(
+        {}, "-created_at", 50),
+}
+
+
+def populate(count: int) -> datetime:
+    """ Fill the in-memory store with count users created one second
+    apart, without writing files, and return the creation time of the
+    last 100
+    """
+    objs = Objects(User)
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        user = User(email="user{}@hbtn.io".format(i))
+        user.created_at = start + timedelta(seconds=i)
+        objs[user.id] = user
+    STORAGE._build_indexes(User, objs)
+    return start + timedelta(seconds=count - 100)
+
+
+def time_query(query, cutoff: datetime) -> float:
+    """ Microseconds per query
+    """
+    timer = timeit.Timer(lambda: query(cutoff))
+    number, _ = timer.autorange()
+    return min(timer.repeat(3, number)) / number * 1e6
+
+
+if __name__ == "__main__":
+    max_users = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print("{:>9} {:>16} {:>14} {:>14}".format("users", "query", "scan (us)",
+                                              "index (us)"))
+    count = 1000
+    while count <= max_users:
+        cutoff = populate(count)
+        for name, query in QUERIES.items():
+            User.sorted_attributes = ()
+            STORAGE._build_indexes(User)
+            scan = time_query(query, cutoff)
+
+            User.sorted_attributes = ("email", "created_at")
+            STORAGE._build_indexes(User)
+            query(cutoff)
+            index = time_query(query, cutoff)
+
+            print("{:>9} {:>16} {:>14.2f} {:>14.2f}".format(
+                count, name, scan, index))
+        count *= 10
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+""" Benchmark of User.search by email with and without the hash index
+Usage: ./benchmark_search.py [max_users]
+"""
+import sys
+import timeit
+
+from models.base import STORAGE
+from models.engine.file_storage import Objects
+from models.user import User
+
+
+def populate(count: int):
+    """ Fill the in-memory store with count users, without writing files
+    """
+    objs = Objects(User)
+    for i in range(count):
+        user = User(email="user{}@hbtn.io".format(i))
+        objs[user.id] = user
+    STORAGE._build_indexes(User, objs)
+
+
+def time_search(email: str) -> float:
+    """ Microseconds per User.search on email
+    """
+    timer = timeit.Timer(lambda: User.search({"email": email}))
+    number, _ = timer.autorange()
+    return min(timer.repeat(3, number)) / number * 1e6
+
+
+if __name__ == "__main__":
+    max_users = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print("{:>9} {:>14} {:>14}".format("users", "scan (us)", "index (us)"))
+    count = 1000
+    while count <= max_users:
+        populate(count)
+        email = "user{}@hbtn.io".format(count // 2)
+
+        User.indexed_attributes = ()
+        STORAGE._build_indexes(User)
+        scan = time_search(email)
+
+        User.indexed_attributes = ("email",)
+        STORAGE._build_indexes(User)
+        index = time_search(email)
+
+        print("{:>9} {:>14.2f} {:>14.2f}".format(count, scan, index))
+        count *= 10
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+""" Benchmark of saving and loading the JSON and binary snapshots of
+Base objects. Each run happens in a temporary directory.
+Usage: ./benchmark_snapshot.py [count,count,...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import models.base
+from models.engine.file_storage import FileStorage, Objects
+from models.user import User
+
+
+def run(snapshot_format: str, count: int) -> dict:
+    """ Time saving count users, then loading them eagerly and lazily
+    """
+    models.base.STORAGE = FileStorage(snapshot_format=snapshot_format)
+    objs = Objects(User)
+    for i in range(count):
+        user = User(email="user{}@hbtn.io".format(i), first_name="First",
+                    last_name="Last{}".format(i))
+        user.password = "pwd{}".format(i)
+        objs[user.id] = user
+    models.base.STORAGE._build_indexes(User, objs)
+    results = {}
+
+    start = time.perf_counter()
+    User.save_to_file()
+    results["save (s)"] = time.perf_counter() - start
+    results["size (MB)"] = os.path.getsize(
+        models.base.STORAGE._file_path(User)) / 1e6
+
+    for lazy in (False, True):
+        models.base.STORAGE = FileStorage(snapshot_format=snapshot_format,
+                                          lazy=lazy)
+        start = time.perf_counter()
+        User.load_from_file()
+        name = "lazy load (s)" if lazy else "load (s)"
+        results[name] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    User.save_to_file()
+    results["lazy save (s)"] = time.perf_counter() - start
+    return results
+
+
+if __name__ == "__main__":
+    counts = [10000, 100000, 1000000]
+    if len(sys.argv) > 1:
+        counts = [int(count) for count in sys.argv[1].split(",")]
+    columns = ["save (s)", "size (MB)", "load (s)", "lazy load (s)",
+               "lazy save (s)"]
+    print("{:>7} {:>9}".format("format", "users") +
+          "".join(" {:>13}".format(column) for column in columns))
+    cwd = os.getcwd()
+    for count in counts:
+        for snapshot_format in ("json", "binary"):
+            with tempfile.TemporaryDirectory() as directory:
+                os.chdir(directory)
+                results = run(snapshot_format, count)
+                os.chdir(cwd)
+            print("{:>7} {:>9}".format(snapshot_format, count) +
+                  "".join(" {:>13.2f}".format(results[column])
+                          for column in columns))
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+""" Benchmark of the file and SQLite storages of Base objects
+The file storage uses its journal with batched writes, the SQLite
+storage commits every save. Each run happens in a temporary directory.
+Usage: ./benchmark_storage.py [count,count,...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import models.base
+from models.engine.file_storage import FileStorage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.user import User
+
+
+STORAGES = {
+    "file": lambda: FileStorage(journal=True, journal_max_size=1 << 40,
+                                durability="batched"),
+    "sqlite": lambda: SQLiteStorage(".db.sqlite3"),
+}
+
+
+def timed(function, repeat: int = 1) -> float:
+    """ Microseconds per call of function
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run(name: str, count: int) -> dict:
+    """ Time the operations of a storage holding count users
+    """
+    models.base.STORAGE = STORAGES[name]()
+    results = {}
+
+    start = time.perf_counter()
+    for i in range(count):
+        User(email="user{}@hbtn.io".format(i), first_name="First",
+             last_name="Last{}".format(i)).save()
+    User.save_to_file()
+    results["insert"] = (time.perf_counter() - start) / count * 1e6
+
+    models.base.STORAGE = STORAGES[name]()
+    start = time.perf_counter()
+    User.load_from_file()
+    User.count()
+    results["load (s)"] = time.perf_counter() - start
+
+    ids = [user.id for user in User.page(None, 1000)]
+    results["get"] = timed(lambda: User.get(random.choice(ids)), 1000)
+    results["search"] = timed(lambda: User.search(
+        {"email": "user{}@hbtn.io".format(random.randrange(count))}), 1000)
+    results["page 100"] = timed(lambda: User.page(random.choice(ids), 100),
+                                100)
+    results["scan (s)"] = timed(
+        lambda: User.search({"last_name": "Last0"})) / 1e6
+    return results
+
+
+if __name__ == "__main__":
+    counts = [10000, 100000, 1000000]
+    if len(sys.argv) > 1:
+        counts = [int(count) for count in sys.argv[1].split(",")]
+    columns = ["insert", "load (s)", "get", "search", "page 100",
+               "scan (s)"]
+    print("times in us unless noted")
+    print("{:>8} {:>9}".format("storage", "users") +
+          "".join(" {:>10}".format(column) for column in columns))
+    cwd = os.getcwd()
+    for count in counts:
+        for name in STORAGES:
+            with tempfile.TemporaryDirectory() as directory:
+                os.chdir(directory)
+                results = run(name, count)
+                os.chdir(cwd)
+            print("{:>8} {:>9}".format(name, count) +
+                  "".join(" {:>10.2f}".format(results[column])
+                          for column in columns))
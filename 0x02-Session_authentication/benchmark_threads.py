@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+""" Stress test of the file storage shared by threads: reader threads get,
+search and count users while a writer thread saves, changes and removes
+others. Every read is checked, as well as every write once the threads
+are done, and the read throughput is printed by number of readers.
+Each run happens in a temporary directory.
+Usage: ./benchmark_threads.py [users] [seconds]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import models.base
+from models.engine.file_storage import FileStorage, Objects
+from models.user import User
+
+
+def populate(count: int) -> list:
+    """ Fill the in-memory store with count users created one second
+    apart, and return their ids
+    """
+    models.base.STORAGE = FileStorage(journal=True,
+                                      journal_max_size=1 << 40,
+                                      durability="batched")
+    objs = Objects(User)
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        user = User(email="user{}@hbtn.io".format(i))
+        user.created_at = start + timedelta(seconds=i)
+        objs[user.id] = user
+    models.base.STORAGE._build_indexes(User, objs)
+    return list(objs.keys())
+
+
+def read(ids: list, count: int):
+    """ One random read, which raises AssertionError if it sees an object
+    missing or twice, or out of order
+    """
+    operation = random.randrange(4)
+    if operation == 0:
+        assert User.get(random.choice(ids)) is not None
+    elif operation == 1:
+        i = random.randrange(count)
+        users = User.search({"email": "user{}@hbtn.io".format(i)})
+        assert len(users) == 1 and users[0].email.startswith("user")
+    elif operation == 2:
+        users = User.search({}, "-created_at", 10)
+        dates = [user.created_at for user in users]
+        assert len(users) == 10 and dates == sorted(dates, reverse=True)
+        assert len(set(user.id for user in users)) == 10
+    else:
+        assert User.count() >= count
+
+
+def write(stop: threading.Event, ids: list, alive: set, removed: list,
+          writes: list):
+    """ Save new users, change existing ones, and remove every other new
+    one until stop is set
+    """
+    i = 0
+    while not stop.is_set():
+        user = User(email="new{}@hbtn.io".format(i))
+        user.save()
+        alive.add(user.id)
+        if i % 2 == 1:
+            User.get(user.id).remove()
+            alive.discard(user.id)
+            removed.append(user.id)
+        changed = User.get(random.choice(ids))
+        changed.first_name = "Changed{}".format(i)
+        changed.save()
+        i += 1
+    writes.append(i)
+
+
+def run(readers: int, count: int, seconds: float) -> dict:
+    """ Run readers reader threads and one writer thread for seconds on
+    count users, then check the users
+    """
+    ids = populate(count)
+    stop = threading.Event()
+    alive, removed, writes, reads, errors = set(), [], [], [], []
+
+    def _reader():
+        done = 0
+        try:
+            while not stop.is_set():
+                read(ids, count)
+                done += 1
+        except Exception as error:
+            errors.append(error)
+        reads.append(done)
+
+    threads = [threading.Thread(target=_reader) for _ in range(readers)]
+    threads.append(threading.Thread(target=write, args=(
+        stop, ids, alive, removed, writes)))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    models.base.STORAGE.flusher.flush()
+    assert len(errors) == 0, errors
+    assert User.count() == count + len(alive)
+    assert all(User.get(obj_id) is not None for obj_id in alive)
+    assert all(User.get(obj_id) is None for obj_id in removed)
+    assert len(User.search({"email__prefix": "new"})) == len(alive)
+    return {"reads/s": sum(reads) / seconds, "writes/s": writes[0] / seconds}
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2
+    print("{:>7} {:>12} {:>12}".format("readers", "reads/s", "writes/s"))
+    cwd = os.getcwd()
+    for readers in (1, 2, 4, 8, 16):
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            results = run(readers, count, seconds)
+            os.chdir(cwd)
+        print("{:>7} {:>12.0f} {:>12.0f}".format(
+            readers, results["reads/s"], results["writes/s"]))
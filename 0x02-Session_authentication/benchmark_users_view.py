@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+""" Latency of GET /api/v1/users, encoding every User with jsonify as
+before, and from the cached JSON of each User
+Usage: ./benchmark_users_view.py [count]
+"""
+import sys
+import time
+
+from api.v1.app import app
+from api.v1.views.users import view_all_users
+from flask import jsonify
+from models.base import STORAGE
+from models.engine.file_storage import Objects
+from models.user import User
+
+
+def latency(function, repeat: int = 5) -> float:
+    """ Best time of a few calls in milliseconds
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    objs = Objects(User)
+    for i in range(count):
+        user = User(email="user{}@hbtn.io".format(i),
+                    first_name="First{}".format(i),
+                    last_name="Last{}".format(i))
+        user.password = "pwd{}".format(i)
+        objs[user.id] = user
+    STORAGE._build_indexes(User, objs)
+
+    with app.test_request_context("/api/v1/users"):
+        before = latency(
+            lambda: jsonify([user.to_json() for user in User.all()]))
+        for user in User.all():
+            object.__setattr__(user, "_json", None)
+        cold = latency(view_all_users, 1)
+        warm = latency(view_all_users)
+        assert view_all_users().get_data() == jsonify(
+            [user.to_json() for user in User.all()]).get_data()
+    print("{} users".format(count))
+    print("jsonify:       {:>9.1f} ms".format(before))
+    print("cached, cold:  {:>9.1f} ms".format(cold))
+    print("cached, warm:  {:>9.1f} ms".format(warm))
@@ -1,40 +1,109 @@
 #!/usr/bin/env python3
 """ Base module
 """
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import TypeVar, List, Iterable
-from os import path
+from os import getenv
+from models.engine.file_storage import FileStorage
+from models.engine.sqlite_storage import SQLiteStorage
+import functools
 import json
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
+EPOCH = datetime(1970, 1, 1)
+JSON_ENCODER = json.JSONEncoder(sort_keys=True, separators=(",", ":"))
+STORAGES = {"file": FileStorage, "sqlite": SQLiteStorage}
+DB_STORAGE = getenv("DB_STORAGE", "file")
+if DB_STORAGE not in STORAGES:
+    raise ValueError("DB_STORAGE must be one of {}"
+                     .format(", ".join(STORAGES)))
+STORAGE = STORAGES[DB_STORAGE]()
+
+
+@functools.lru_cache(maxsize=None)
+def attribute_names(cls: type) -> tuple:
+    """ Names of the attributes of the instances of a Base subclass, in
+    the order they are declared in __slots__
+    """
+    names = ["id", "created_at", "updated_at"]
+    for klass in reversed(cls.__mro__[:cls.__mro__.index(Base)]):
+        names.extend(klass.__dict__.get("__slots__", ()))
+    return tuple(names)
 
 
 class Base():
     """ Base class
+    Subclasses declare their attributes in __slots__, and the timestamps
+    are stored as seconds since the epoch, to keep instances small.
+    The encoded JSON of an object is cached until one of its attributes
+    is set.
+    Subclasses list in indexed_attributes the attributes search() can
+    find by value without going through all objects, and in
+    sorted_attributes the ones it can find by range or prefix, or return
+    in order.
+    Objects are kept by STORAGE, set by DB_STORAGE: "file" for the
+    FileStorage of .db_<Class>.json files, or .db_<Class>.bin files with
+    DB_FORMAT=binary, "sqlite" for a SQLiteStorage. Both can be shared
+    by threads, and the file storage reads without locks.
     """
 
+    __slots__ = ("id", "_created_at", "_updated_at", "_json")
+    indexed_attributes = ()
+    sorted_attributes = ()
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
+        Timestamps are strings in TIMESTAMP_FORMAT, or seconds since the
+        epoch as read from a binary snapshot
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
-        self.id = kwargs.get('id', str(uuid.uuid4()))
-        if kwargs.get('created_at') is not None:
+        self.id = kwargs['id'] if 'id' in kwargs else str(uuid.uuid4())
+        if type(kwargs.get('created_at')) is int:
+            self._created_at = kwargs.get('created_at')
+        elif kwargs.get('created_at') is not None:
             self.created_at = datetime.strptime(kwargs.get('created_at'),
                                                 TIMESTAMP_FORMAT)
         else:
             self.created_at = datetime.utcnow()
-        if kwargs.get('updated_at') is not None:
+        if type(kwargs.get('updated_at')) is int:
+            self._updated_at = kwargs.get('updated_at')
+        elif kwargs.get('updated_at') is not None:
             self.updated_at = datetime.strptime(kwargs.get('updated_at'),
                                                 TIMESTAMP_FORMAT)
         else:
             self.updated_at = datetime.utcnow()
 
+    @property
+    def created_at(self) -> datetime:
+        """ Getter of the creation time
+        """
+        return EPOCH + timedelta(seconds=self._created_at)
+
+    @created_at.setter
+    def created_at(self, value: datetime):
+        """ Setter of the creation time, kept in seconds since the epoch
+        """
+        self._created_at = int((value - EPOCH).total_seconds())
+
+    @property
+    def updated_at(self) -> datetime:
+        """ Getter of the last update time
+        """
+        return EPOCH + timedelta(seconds=self._updated_at)
+
+    @updated_at.setter
+    def updated_at(self, value: datetime):
+        """ Setter of the last update time, kept in seconds since the epoch
+        """
+        self._updated_at = int((value - EPOCH).total_seconds())
+
+    def __setattr__(self, name: str, value):
+        """ Set an attribute and drop the cached JSON
+        """
+        object.__setattr__(self, "_json", None)
+        object.__setattr__(self, name, value)
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -48,7 +117,11 @@ class Base():
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        attributes = [(key, getattr(self, key))
+                      for key in attribute_names(self.__class__)
+                      if hasattr(self, key)]
+        attributes.extend(getattr(self, "__dict__", {}).items())
+        for key, value in attributes:
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -57,56 +130,44 @@ class Base():
                 result[key] = value
         return result
 
+    def to_json_bytes(self) -> bytes:
+        """ Return to_json() encoded like jsonify does: compact, with sorted
+        keys. The bytes are cached until the object changes
+        """
+        data = getattr(self, "_json", None)
+        if data is None:
+            data = JSON_ENCODER.encode(self.to_json()).encode()
+            object.__setattr__(self, "_json", data)
+        return data
+
     @classmethod
     def load_from_file(cls):
         """ Load all objects from file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        STORAGE.load(cls)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
-
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        STORAGE.dump(cls)
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        STORAGE.save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        STORAGE.remove(self)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return STORAGE.count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -114,24 +175,28 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def page(cls, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects ordered by id, starting after the
+        id after
+        """
+        return STORAGE.page(cls, after, limit)
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return STORAGE.get(cls, id)
 
     @classmethod
-    def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
+    def search(cls, attributes: dict = {}, order_by: str = None,
+               limit: int = None) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+        A key of attributes is an attribute name, for equality, or an
+        attribute name followed by __lt, __lte, __gt, __gte, __prefix or
+        __in, like {"created_at__lt": datetime(2024, 1, 1)}
+        order_by is an attribute name, prefixed with "-" for descending
+        order, like "-created_at", and limit the maximum number of objects
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+        return STORAGE.search(cls, attributes, order_by, limit)
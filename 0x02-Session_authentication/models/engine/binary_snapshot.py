@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+""" Binary snapshot module: objects of a class as length-prefixed binary
+records, read through a memoryview over the mapped file
+"""
+from datetime import datetime, timedelta
+from typing import BinaryIO, Iterable
+import json
+import mmap
+import struct
+
+
+MAGIC = b"BASEDB\x01\n"
+EXTRA = ""
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+I64 = struct.Struct("<q")
+F64 = struct.Struct("<d")
+ABSENT, NONE, FALSE, TRUE, INT, FLOAT, STR, TIMESTAMP, JSON = range(9)
+MISSING = object()
+EPOCH = datetime(1970, 1, 1)
+SECOND = timedelta(seconds=1)
+
+
+class BinarySnapshot():
+    """ Snapshot file made of a header and one record per object
+    - header: MAGIC, then the number of fields and the length and UTF-8
+      name of each field, in the order of the values of every record
+    - record: its length on 4 bytes, then a type tag per field, then an
+      8 byte slot per field, then the text of the strings, one after the
+      other in UTF-8. A slot holds an integer, a float, a datetime as
+      seconds since the epoch, or the number of characters of a string,
+      or of the JSON of the other values. The last field, named "", holds
+      the attributes of an object missing from the header
+    A record is decoded with one struct call for its slots and one UTF-8
+    decoding for its text. Timestamps are decoded as seconds since the
+    epoch, which Base accepts
+    """
+
+    def __init__(self, view: memoryview, fields: tuple, start: int):
+        """ Initialize a snapshot from the view of its file, the fields of
+        its header, and the position of its first record
+        """
+        self.view = view
+        self.fields = fields
+        self.start = start
+        self.slots = struct.Struct("<{}q".format(len(fields)))
+
+    @classmethod
+    def open(cls, file_path: str) -> 'BinarySnapshot':
+        """ Map a snapshot file and read its header
+        Raise ValueError if it is not a binary snapshot
+        """
+        with open(file_path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("{} is not a binary snapshot"
+                                 .format(file_path))
+            view = memoryview(mmap.mmap(f.fileno(), 0,
+                                        access=mmap.ACCESS_READ))
+        count = U16.unpack_from(view, len(MAGIC))[0]
+        i = len(MAGIC) + 2
+        fields = []
+        for _ in range(count):
+            length = U16.unpack_from(view, i)[0]
+            fields.append(str(view[i + 2:i + 2 + length], "utf-8"))
+            i += 2 + length
+        return cls(view, tuple(fields), i)
+
+    def positions(self, fields: tuple = ()) -> Iterable[tuple]:
+        """ Iterate over the (start, end) of every record, followed by the
+        values of fields, without decoding the others. Timestamps are ISO
+        strings like in JSON records, so that they are indexed the same way
+        """
+        view = self.view
+        count = len(self.fields)
+        wanted = tuple(self.fields.index(field) if field in self.fields
+                       else None for field in fields)
+        i = self.start
+        while i < len(view):
+            start = i + 4
+            end = start + U32.unpack_from(view, i)[0]
+            if wanted:
+                tags = view[start:start + count]
+                slots = self.slots.unpack_from(view, start + count)
+                text = str(view[start + 9 * count:end], "utf-8")
+                yield (start, end) + tuple(
+                    None if index is None
+                    else self._value(tags, slots, text, index, True)
+                    for index in wanted)
+            else:
+                yield start, end
+            i = end
+
+    @staticmethod
+    def _value(tags: memoryview, slots: tuple, text: str, index: int,
+               iso: bool = False):
+        """ Value of the field at index of a record
+        """
+        tag = tags[index]
+        slot = slots[index]
+        if tag == STR or tag == JSON:
+            i = sum(slots[j] for j in range(index)
+                    if tags[j] == STR or tags[j] == JSON)
+            if tag == JSON:
+                return json.loads(text[i:i + slot])
+            return text[i:i + slot]
+        if tag == TIMESTAMP and iso:
+            return (EPOCH + SECOND * slot).isoformat()
+        if tag == INT or tag == TIMESTAMP:
+            return slot
+        if tag == FLOAT:
+            return F64.unpack(I64.pack(slot))[0]
+        return (MISSING, None, False, True)[tag]
+
+    def _values(self, start: int, end: int) -> list:
+        """ Values of the record between start and end, in the order of
+        fields
+        """
+        count = len(self.fields)
+        slots = self.slots.unpack_from(self.view, start + count)
+        text = str(self.view[start + 9 * count:end], "utf-8")
+        values = []
+        i = 0
+        for tag, slot in zip(self.view[start:start + count], slots):
+            if tag == STR:
+                values.append(text[i:i + slot])
+                i += slot
+            elif tag == INT or tag == TIMESTAMP:
+                values.append(slot)
+            elif tag == JSON:
+                values.append(json.loads(text[i:i + slot]))
+                i += slot
+            elif tag == FLOAT:
+                values.append(F64.unpack(I64.pack(slot))[0])
+            else:
+                values.append((MISSING, None, False, True)[tag])
+        return values
+
+    def read(self, start: int, end: int) -> dict:
+        """ Decode the record between start and end as the JSON record of
+        an object
+        """
+        record = {}
+        for field, value in zip(self.fields, self._values(start, end)):
+            if value is MISSING:
+                continue
+            if field == EXTRA:
+                record.update(value)
+            else:
+                record[field] = value
+        return record
+
+    def raw(self, start: int, end: int) -> memoryview:
+        """ Bytes of the record between start and end, with its length
+        """
+        return self.view[start - 4:end]
+
+    @staticmethod
+    def write(f: BinaryIO, fields: tuple, rows: Iterable):
+        """ Write a snapshot of rows, which are either the values of fields,
+        MISSING for the attributes an object does not have, followed by a
+        dictionary of the other attributes, or the bytes of a record of a
+        snapshot with the same fields
+        """
+        fields = tuple(fields) + (EXTRA,)
+        header = bytearray(MAGIC)
+        header += U16.pack(len(fields))
+        for field in fields:
+            name = field.encode()
+            header += U16.pack(len(name)) + name
+        f.write(header)
+
+        pack = struct.Struct("<{}q".format(len(fields))).pack
+        chunk = bytearray()
+        for row in rows:
+            if type(row) is memoryview:
+                chunk += row
+                continue
+            tags = bytearray()
+            slots = []
+            texts = []
+            for value in row[:-1] + (row[-1] or MISSING,):
+                tag, slot, value = BinarySnapshot._encode(value)
+                tags.append(tag)
+                slots.append(slot)
+                if value is not None:
+                    texts.append(value)
+            text = "".join(texts).encode()
+            chunk += U32.pack(len(tags) + 8 * len(slots) + len(text))
+            chunk += tags
+            chunk += pack(*slots)
+            chunk += text
+            if len(chunk) > 1 << 20:
+                f.write(chunk)
+                chunk = bytearray()
+        f.write(chunk)
+
+    @staticmethod
+    def _encode(value) -> tuple:
+        """ Tag, slot and text of a value
+        """
+        kind = type(value)
+        if kind is str:
+            return STR, len(value), value
+        if kind is datetime:
+            return TIMESTAMP, (value - EPOCH) // SECOND, None
+        if value is MISSING:
+            return ABSENT, 0, None
+        if value is None:
+            return NONE, 0, None
+        if kind is bool:
+            return (TRUE if value else FALSE), 0, None
+        if kind is int and -1 << 63 <= value < 1 << 63:
+            return INT, value, None
+        if kind is float:
+            return FLOAT, I64.unpack(F64.pack(value))[0], None
+        text = json.dumps(value)
+        return JSON, len(text), text
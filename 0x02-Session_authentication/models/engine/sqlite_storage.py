@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+""" SQLite storage module: one table per class in a SQLite database
+"""
+from models.engine.storage import DB_DURABILITY, DURABILITY_MODES, Storage
+from models.engine.storage import matches, order, ordering, predicates
+from models.engine.storage import prefix_end, sort_key
+from typing import TypeVar, List
+from os import getenv
+import json
+import sqlite3
+import threading
+
+
+DB_SQLITE_PATH = getenv("DB_SQLITE_PATH", ".db.sqlite3")
+SQL_TYPES = (str, int, float, bool, type(None))
+SQL_OPERATORS = {"eq": "IS", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+
+
+class SQLiteStorage(Storage):
+    """ Storage keeping the objects of each class in a table, with the
+    JSON record of an object in the data column and every attribute of
+    indexed_attributes and sorted_attributes in an indexed column of its
+    own, which search() filters and orders on
+    Queries are always the same strings with bound parameters, so the
+    sqlite3 statement cache prepares each of them only once
+    - durability: fsync syncs every commit to disk, sync and batched
+      only sync the write-ahead log at checkpoints
+    """
+
+    def __init__(self, db_path: str = DB_SQLITE_PATH,
+                 durability: str = DB_DURABILITY):
+        """ Initialize the storage and open the database
+        """
+        if durability not in DURABILITY_MODES:
+            raise ValueError("durability must be one of {}"
+                             .format(", ".join(DURABILITY_MODES)))
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous={}".format(
+            "FULL" if durability == "fsync" else "NORMAL"))
+        self.lock = threading.Lock()
+        self.tables = {}
+
+    @staticmethod
+    def _columns(cls: type) -> tuple:
+        """ Attributes of a class kept in columns
+        """
+        return tuple(dict.fromkeys(cls.indexed_attributes +
+                                   cls.sorted_attributes))
+
+    def _statements(self, cls: type) -> dict:
+        """ SQL statements of a class, creating its table or adding the
+        columns it misses on first use
+        """
+        s_class = cls.__name__
+        if s_class in self.tables:
+            return self.tables[s_class]
+
+        table = '"{}"'.format(s_class)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS {} "
+                "(id TEXT PRIMARY KEY, data TEXT NOT NULL)".format(table))
+            columns = [row[1] for row in self.connection.execute(
+                "PRAGMA table_info({})".format(table))]
+            for attribute in self._columns(cls):
+                if attribute not in columns:
+                    self.connection.execute(
+                        'ALTER TABLE {} ADD COLUMN "{}"'.format(
+                            table, attribute))
+                    self.connection.execute(
+                        'UPDATE {} SET "{}" = json_extract(data, ?)'.format(
+                            table, attribute), ("$." + attribute,))
+                self.connection.execute(
+                    'CREATE INDEX IF NOT EXISTS "{}_{}" ON {} ("{}")'.format(
+                        s_class, attribute, table, attribute))
+
+        columns = "".join(', "{}"'.format(attribute)
+                          for attribute in self._columns(cls))
+        updates = "".join(', "{0}" = excluded."{0}"'.format(attribute)
+                          for attribute in self._columns(cls))
+        self.tables[s_class] = {
+            "save": "INSERT INTO {} (id, data{}) VALUES (?, ?{}) "
+                    "ON CONFLICT(id) DO UPDATE SET data = excluded.data{}"
+                    .format(table, columns,
+                            ", ?" * len(self._columns(cls)), updates),
+            "remove": "DELETE FROM {} WHERE id = ?".format(table),
+            "count": "SELECT COUNT(*) FROM {}".format(table),
+            "get": "SELECT data FROM {} WHERE id = ?".format(table),
+            "page": "SELECT data FROM {} WHERE id > ? ORDER BY id LIMIT ?"
+                    .format(table),
+            "search": "SELECT data FROM {}".format(table),
+        }
+        return self.tables[s_class]
+
+    def _query(self, cls: type, sql: str,
+               params: tuple = ()) -> List[TypeVar('Base')]:
+        """ Build the objects of the rows of a query selecting data
+        """
+        with self.lock:
+            rows = self.connection.execute(sql, params).fetchall()
+        return [cls(**json.loads(row[0])) for row in rows]
+
+    def load(self, cls: type):
+        """ Objects stay in the database, only create their table
+        """
+        self._statements(cls)
+
+    def dump(self, cls: type):
+        """ Every save is already committed
+        """
+        self._statements(cls)
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update an object
+        """
+        cls = obj.__class__
+        sql = self._statements(cls)["save"]
+        params = (obj.id, json.dumps(obj.to_json(True))) + tuple(
+            sort_key(getattr(obj, attribute, None))
+            for attribute in self._columns(cls))
+        with self.lock, self.connection:
+            self.connection.execute(sql, params)
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object
+        """
+        sql = self._statements(obj.__class__)["remove"]
+        with self.lock, self.connection:
+            self.connection.execute(sql, (obj.id,))
+
+    def count(self, cls: type) -> int:
+        """ Count all objects of a class
+        """
+        sql = self._statements(cls)["count"]
+        with self.lock:
+            return self.connection.execute(sql).fetchone()[0]
+
+    def get(self, cls: type, obj_id: str) -> TypeVar('Base'):
+        """ Return one object of a class by ID
+        """
+        objs = self._query(cls, self._statements(cls)["get"], (obj_id,))
+        return objs[0] if objs else None
+
+    def page(self, cls: type, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects ordered by id, starting after the
+        id after
+        """
+        return self._query(cls, self._statements(cls)["page"],
+                           (after or "", -1 if limit is None else limit))
+
+    def search(self, cls: type, attributes: dict = {},
+               order_by: str = None,
+               limit: int = None) -> List[TypeVar('Base')]:
+        """ Search the objects matching all predicates of attributes,
+        ordered by order_by, up to limit
+        Predicates on columns with plain operands are matched by the
+        database, the others once the objects are built. The database also
+        orders and limits the rows when it can
+        """
+        columns = ("id",) + self._columns(cls)
+        where = []
+        params = []
+        others = []
+        for k, operator, v in predicates(attributes):
+            if k not in columns:
+                others.append((k, operator, v))
+            elif operator in SQL_OPERATORS and type(v) in SQL_TYPES:
+                where.append('"{}" {} ?'.format(k, SQL_OPERATORS[operator]))
+                params.append(v)
+            elif operator == "in" and None not in v and \
+                    all(type(value) in SQL_TYPES for value in v):
+                where.append('"{}" IN ({})'.format(
+                    k, ", ".join("?" * len(v))))
+                params.extend(v)
+            elif operator == "prefix" and type(v) is str and v:
+                where.append('"{}" >= ?'.format(k))
+                params.append(v)
+                if prefix_end(v) is not None:
+                    where.append('"{}" < ?'.format(k))
+                    params.append(prefix_end(v))
+            else:
+                others.append((k, operator, v))
+        sql = self._statements(cls)["search"]
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        attribute, descending = ordering(order_by or "")
+        in_sql = order_by is None or attribute in columns
+        if order_by is None:
+            sql += " ORDER BY rowid"
+        elif attribute in columns:
+            sql += ' ORDER BY "{0}"{1}, id{1}'.format(
+                attribute, " DESC" if descending else "")
+        if in_sql and not others and limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        objs = self._query(cls, sql, tuple(params))
+
+        objs = [obj for obj in objs
+                if all(matches(getattr(obj, k), operator, v)
+                       for k, operator, v in others)]
+        if not in_sql:
+            return order(objs, order_by, limit)
+        return objs[:limit]
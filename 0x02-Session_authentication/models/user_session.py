@@ -9,6 +9,10 @@ from models.base import Base
 class UserSession(Base):
     """A class used to represent a UserSession."""
 
+    __slots__ = ("user_id", "session_id")
+    indexed_attributes = ("session_id",)
+    sorted_attributes = ("created_at",)
+
     def __init__(self, *args: list, **kwargs: dict):
         """Initializes the UserSession with the user ID and session ID."""
         super().__init__(*args, **kwargs)
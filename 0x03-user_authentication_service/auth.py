@@ -2,6 +2,9 @@
 """Module contains the logic for user authentication"""
 
 from typing import Union
+import functools
+import os
+import time
 import uuid
 
 import bcrypt
@@ -11,11 +14,66 @@ from db import DB
 from user import User
 
 
+def _calibrate_rounds(budget_ms: float, min_rounds: int = 4,
+                      max_rounds: int = 16) -> int:
+    """
+    Returns the highest bcrypt cost factor (between min_rounds and
+    max_rounds) whose hash takes at most budget_ms milliseconds on this
+    machine. Every extra round doubles the work, so the time measured at
+    min_rounds gives an estimate. The estimate is then timed, and the
+    cost stepped down one round at a time while it is over the budget;
+    each timing is the fastest of three hashes. Copied from
+    calibrate_rounds in 0x00-personal_data/encrypt_password.py, keep the
+    two in sync.
+    """
+    def measure(rounds: int) -> float:
+        """Milliseconds taken by the fastest of three hashes."""
+        salt = bcrypt.gensalt(rounds)
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            bcrypt.hashpw(b"calibration", salt)
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
+
+    base = measure(min_rounds)
+    rounds = min_rounds
+    while rounds < max_rounds:
+        if base * 2 ** (rounds + 1 - min_rounds) > budget_ms:
+            break
+        rounds += 1
+    while rounds > min_rounds and measure(rounds) > budget_ms:
+        rounds -= 1
+    return rounds
+
+
+@functools.lru_cache(maxsize=1)
+def _target_rounds() -> int:
+    """
+    Returns the cost factor for new hashes: BCRYPT_ROUNDS if set, else
+    calibrated against BCRYPT_BUDGET_MS if set, else bcrypt's default 12.
+    Copied from target_rounds in 0x00-personal_data/encrypt_password.py.
+    """
+    if os.getenv("BCRYPT_ROUNDS"):
+        return int(os.getenv("BCRYPT_ROUNDS"))
+    if os.getenv("BCRYPT_BUDGET_MS"):
+        return _calibrate_rounds(float(os.getenv("BCRYPT_BUDGET_MS")))
+    return 12
+
+
 def _hash_password(password: str) -> bytes:
     """
     Hashes a password using bcrypt and returns the hashed password.
     """
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(_target_rounds()))
+
+
+def _needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Returns True if a hash was made with another cost factor than the
+    one new hashes use.
+    """
+    return int(hashed_password.split(b"$")[2]) != _target_rounds()
 
 
 def _generate_uuid() -> str:
@@ -55,7 +113,8 @@ class Auth:
         """
         Validates the login credentials of a user.
         If the user does not exist or the password is incorrect,
-        False is returned.
+        False is returned. A valid password hashed with an outdated cost
+        factor is rehashed.
         """
         try:
             user = self._db.find_user_by(email=email)
@@ -66,7 +125,14 @@ class Auth:
         # if isinstance(hashed_pwd, str):
         #     hashed_pwd = hashed_pwd.encode()
 
-        return bcrypt.checkpw(password.encode(), hashed_pwd)
+        if not bcrypt.checkpw(password.encode(), hashed_pwd):
+            return False
+
+        if _needs_rehash(hashed_pwd):
+            self._db.update_user(
+                user.id, hashed_password=_hash_password(password)
+            )
+        return True
 
     def create_session(self, email: str) -> Union[str, None]:
         """